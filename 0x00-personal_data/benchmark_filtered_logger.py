@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the personal data logging hot path.
+Measures filter_datum and RedactingFormatter.format throughput and
+per-call latency while sweeping message length, number of PII fields,
+fraction of those fields present in the message and separator.
+
+Usage:
+    ./benchmark_filtered_logger.py -o results.json
+    ./benchmark_filtered_logger.py --baseline -o results.json
+    ./benchmark_filtered_logger.py --compare previous.json -o results.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import platform
+import re
+import sys
+import timeit
+from typing import Callable, Dict, List
+
+from filtered_logger import RedactingFormatter, filter_datum
+
+
+FIELD_POOL = ("name", "email", "phone", "ssn", "password",
+              "address", "dob", "card", "iban", "token")
+MESSAGE_LENGTHS = (64, 256, 1024, 4096)
+FIELD_COUNTS = (1, 3, 5, 10)
+PRESENT_FRACTIONS = (0.0, 0.5, 1.0)
+SEPARATORS = (";", ",")
+REDACTION = "***"
+
+
+def reference_filter_datum(fields: List[str], redaction: str,
+                           message: str, separator: str) -> str:
+    """ The original one-re.sub-per-field implementation of filter_datum """
+    for f in fields:
+        message = re.sub(f'{f}=.*?{separator}',
+                         f'{f}={redaction}{separator}', message)
+    return message
+
+
+def build_message(fields: List[str], present: float, length: int,
+                  separator: str) -> str:
+    """
+    Returns a `k=v<sep>` message of about `length` characters holding
+    the first `present` fraction of `fields`, padded with non-PII pairs
+    """
+    present_fields = fields[:round(len(fields) * present)]
+    pairs = [f"{f}=value_of_{f}" for f in present_fields]
+    filler = 0
+    while len(separator.join(pairs)) < length:
+        pairs.append(f"extra{filler}=some non sensitive data")
+        filler += 1
+    return separator.join(pairs) + separator
+
+
+def measure(func: Callable[[], object], min_time: float) -> Dict[str, float]:
+    """ Returns calls per second and mean latency (microseconds) of func """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time / 10:
+            break
+        number *= 10
+    number = max(1, int(number * min_time / elapsed))
+    best = min(timer.repeat(repeat=3, number=number))
+    return {"calls": number,
+            "ops_per_sec": number / best,
+            "latency_us": best / number * 1e6}
+
+
+def run_case(fields: List[str], present: float, length: int,
+             separator: str, min_time: float, baseline: bool) -> dict:
+    """ Benchmarks one point of the sweep """
+    message = build_message(fields, present, length, separator)
+    result = {"message_length": len(message), "fields": len(fields),
+              "present": present, "separator": separator}
+
+    result["filter_datum"] = measure(
+        lambda: filter_datum(fields, REDACTION, message, separator),
+        min_time)
+
+    if separator == RedactingFormatter.SEPARATOR:
+        formatter = RedactingFormatter(fields)
+        record = logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                                   message, None, None)
+
+        def format_record():
+            record.msg = message
+            return formatter.format(record)
+        result["formatter"] = measure(format_record, min_time)
+
+    if baseline:
+        expected = reference_filter_datum(fields, REDACTION, message,
+                                          separator)
+        actual = filter_datum(fields, REDACTION, message, separator)
+        result["baseline"] = measure(
+            lambda: reference_filter_datum(fields, REDACTION, message,
+                                           separator),
+            min_time)
+        result["identical"] = expected == actual
+        result["speedup"] = (result["filter_datum"]["ops_per_sec"]
+                             / result["baseline"]["ops_per_sec"])
+    return result
+
+
+def case_key(case: dict) -> tuple:
+    """ Identifies a sweep point across result files """
+    return (case["message_length"], case["fields"], case["present"],
+            case["separator"])
+
+
+def compare(previous: dict, current: dict, threshold: float) -> int:
+    """
+    Prints the throughput ratio of every case against a previous run
+    Returns the number of cases slower than `threshold`
+    """
+    before = {case_key(c): c for c in previous["cases"]}
+    regressions = 0
+    for case in current["cases"]:
+        old = before.get(case_key(case))
+        if old is None:
+            continue
+        for name in ("filter_datum", "formatter"):
+            if name not in case or name not in old:
+                continue
+            ratio = case[name]["ops_per_sec"] / old[name]["ops_per_sec"]
+            flag = ""
+            if ratio < threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{name:12} len={case['message_length']:5} "
+                  f"fields={case['fields']:2} present={case['present']:.1f} "
+                  f"sep={case['separator']!r} x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main() -> int:
+    """ Runs the sweep and writes the results as JSON """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-o", "--output", default="bench_results.json",
+                        help="file to write the JSON results to")
+    parser.add_argument("--baseline", action="store_true",
+                        help="also time the original filter_datum and "
+                             "check the outputs are identical")
+    parser.add_argument("--compare", metavar="PREVIOUS",
+                        help="JSON results of a previous run to compare to")
+    parser.add_argument("--threshold", type=float, default=0.9,
+                        help="throughput ratio below which a case is "
+                             "reported as a regression")
+    parser.add_argument("--min-time", type=float, default=0.1,
+                        help="seconds spent per timing repeat")
+    args = parser.parse_args()
+
+    cases = []
+    for length, count, present, separator in itertools.product(
+            MESSAGE_LENGTHS, FIELD_COUNTS, PRESENT_FRACTIONS, SEPARATORS):
+        fields = list(FIELD_POOL[:count])
+        case = run_case(fields, present, length, separator,
+                        args.min_time, args.baseline)
+        cases.append(case)
+        line = (f"len={case['message_length']:5} fields={count:2} "
+                f"present={present:.1f} sep={separator!r} "
+                f"{case['filter_datum']['latency_us']:8.2f}us")
+        if args.baseline:
+            line += (f" baseline={case['baseline']['latency_us']:8.2f}us"
+                     f" x{case['speedup']:.2f}"
+                     f" identical={case['identical']}")
+        print(line)
+
+    results = {"python": platform.python_version(),
+               "machine": platform.machine(),
+               "cases": cases}
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    status = 0
+    if args.baseline and not all(c["identical"] for c in cases):
+        print("filter_datum output differs from the baseline")
+        status = 1
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if compare(previous, results, args.threshold):
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,9 +2,101 @@
 """
 Module for password encryption and validation.
 """
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count, getenv
+from typing import (Any, Callable, Iterable, Iterator, List, NamedTuple,
+                    Optional, Tuple, Union)
+import time
 import bcrypt
 
 
+MAX_WORKERS = min(32, cpu_count() or 1)
+BCRYPT_TARGET_MS = 250
+BCRYPT_MIN_ROUNDS = 4
+BCRYPT_DEFAULT_ROUNDS = 12
+BCRYPT_MAX_ROUNDS = 31
+ROUNDS_FILE = ".bcrypt_rounds"
+_rounds = None
+
+
+def calibrate_rounds(target_ms: float = BCRYPT_TARGET_MS) -> int:
+    """
+    Find the bcrypt cost whose hashing time on this host is closest to,
+    without exceeding, the target.
+    Args:
+        target_ms (float): The time budget for one hash in milliseconds.
+    Returns:
+        int: The number of bcrypt rounds to use.
+    """
+    # Time a cheap cost, then extrapolate: each round doubles the work
+    rounds = 8
+    salt = bcrypt.gensalt(rounds)
+    elapsed = None
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        sample = (time.perf_counter() - start) * 1000
+        elapsed = sample if elapsed is None else min(elapsed, sample)
+
+    while rounds > BCRYPT_MIN_ROUNDS and elapsed > target_ms:
+        rounds -= 1
+        elapsed /= 2
+    while rounds < BCRYPT_MAX_ROUNDS and elapsed * 2 <= target_ms:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+
+def get_rounds() -> int:
+    """
+    Return the bcrypt cost for new hashes: BCRYPT_ROUNDS if set (clamped
+    to BCRYPT_MIN_ROUNDS..BCRYPT_MAX_ROUNDS, the range gensalt accepts),
+    else the cost stored in ROUNDS_FILE, else a fresh calibration
+    against BCRYPT_TARGET_MS, which is then stored in ROUNDS_FILE when
+    it is writable. Stored and calibrated costs never go below
+    BCRYPT_DEFAULT_ROUNDS, so a calibration on a loaded host can't
+    weaken new hashes.
+    """
+    global _rounds
+    if _rounds is not None:
+        return _rounds
+    try:
+        rounds = int(getenv("BCRYPT_ROUNDS", ""))
+        _rounds = min(max(rounds, BCRYPT_MIN_ROUNDS), BCRYPT_MAX_ROUNDS)
+        return _rounds
+    except ValueError:
+        pass
+    try:
+        with open(ROUNDS_FILE) as f:
+            rounds = int(f.read())
+    except (OSError, ValueError):
+        rounds = calibrate_rounds()
+        try:
+            with open(ROUNDS_FILE, "w") as f:
+                f.write(str(rounds))
+        except OSError:
+            pass  # keep the calibrated cost for this process only
+    _rounds = min(max(rounds, BCRYPT_DEFAULT_ROUNDS), BCRYPT_MAX_ROUNDS)
+    return _rounds
+
+
+def needs_rehash(hashed_password: Union[bytes, str]) -> bool:
+    """
+    Check whether a hash was made with a lower cost than get_rounds();
+    hashes are only ever upgraded. Call it once is_valid succeeds and
+    store hash_password(password) when it returns True.
+    Args:
+        hashed_password (ByteString): The hashed password.
+    Returns:
+        bool: True if the password should be hashed again.
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode()
+    return int(hashed_password.split(b"$")[2]) < get_rounds()
+
+
 def hash_password(password: str) -> bytes:
     """
     Hash a password with a salt using bcrypt.
@@ -14,7 +106,7 @@ def hash_password(password: str) -> bytes:
         ByteString: The hashed password as a byte string.
     """
     encoded = password.encode()
-    hashed = bcrypt.hashpw(encoded, bcrypt.gensalt())
+    hashed = bcrypt.hashpw(encoded, bcrypt.gensalt(get_rounds()))
 
     return hashed
 
@@ -34,3 +126,88 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     if bcrypt.checkpw(encoded, hashed_password):
         valid = True
     return valid
+
+
+class BatchResult(NamedTuple):
+    """
+    Outcome of one item of a batch call.
+    Attributes:
+        value: The hash (or validity) computed for the item,
+        None if it failed.
+        error (Exception): The exception raised for the item, if any.
+    """
+    value: Any
+    error: Optional[Exception] = None
+
+
+def _attempt(func: Callable, args: tuple) -> BatchResult:
+    """
+    Run func on one item, capturing its exception instead of raising.
+    """
+    try:
+        return BatchResult(func(*args))
+    except Exception as e:
+        return BatchResult(None, e)
+
+
+def _run_batch(func: Callable, items: Iterable[tuple],
+               max_workers: int = None) -> Iterator[BatchResult]:
+    """
+    Run func over items on a thread pool (bcrypt releases the GIL),
+    yielding the results in input order. At most twice the worker
+    count of items are in flight, so large iterables are not buffered.
+    """
+    workers = max(1, min(max_workers or MAX_WORKERS, MAX_WORKERS))
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for args in items:
+            pending.append(executor.submit(_attempt, func, args))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def hash_passwords(passwords: Iterable[str],
+                   max_workers: int = None) -> List[BatchResult]:
+    """
+    Hash many passwords concurrently.
+    Args:
+        passwords (Iterable[str]): The passwords to hash.
+        max_workers (int): Number of threads, capped at MAX_WORKERS.
+    Returns:
+        List[BatchResult]: One result per password, in input order,
+        holding the hashed password or the error raised for it.
+    """
+    return list(_run_batch(hash_password,
+                           ((pwd,) for pwd in passwords), max_workers))
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]],
+                max_workers: int = None) -> List[BatchResult]:
+    """
+    Validate many (hashed_password, password) pairs concurrently.
+    Args:
+        pairs (Iterable[Tuple[bytes, str]]): The pairs to validate.
+        max_workers (int): Number of threads, capped at MAX_WORKERS.
+    Returns:
+        List[BatchResult]: One result per pair, in input order,
+        holding is_valid's answer or the error raised for it.
+    """
+    return list(_run_batch(is_valid, pairs, max_workers))
+
+
+async def hash_passwords_async(passwords: Iterable[str],
+                               max_workers: int = None) -> List[BatchResult]:
+    """
+    Awaitable version of hash_passwords; the event loop is not blocked.
+    """
+    return await asyncio.to_thread(hash_passwords, passwords, max_workers)
+
+
+async def verify_many_async(pairs: Iterable[Tuple[bytes, str]],
+                            max_workers: int = None) -> List[BatchResult]:
+    """
+    Awaitable version of verify_many; the event loop is not blocked.
+    """
+    return await asyncio.to_thread(verify_many, pairs, max_workers)
@@ -2,58 +2,315 @@
 """
 Module for handling Personal Data
 """
-from typing import List
+from functools import lru_cache
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, TextIO, Tuple
 import re
+import sys
+import time
+import queue
 import logging
-from os import environ
+import threading
+from os import cpu_count, environ
 import mysql.connector
+import mysql.connector.pooling
 
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
 
 
+class RedactionEngine:
+    """ Redacts every field of a message in a single regex pass
+    """
+
+    def __init__(self, fields: Tuple[str, ...], redaction: str,
+                 separator: str):
+        """ Compile one alternation pattern covering all the fields """
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self._pattern = None
+        if not self.fields:
+            return
+
+        # Anchor on the literal "=" so the scan skips ahead with a fast
+        # literal search, then check which field precedes it. The field
+        # name itself is left untouched, so only "=value<sep>" is replaced.
+        fields = '|'.join(f'(?<={f}=)' for f in self.fields)
+        self._pattern = re.compile(f'=(?:{fields}).*?{separator}')
+        self._replacement = f'={redaction}{separator}'
+
+    def redact(self, message: str) -> str:
+        """ Returns the message with every field value obfuscated """
+        if self._pattern is None:
+            return message
+        return self._pattern.sub(self._replacement, message)
+
+
+@lru_cache(maxsize=128)
+def get_redaction_engine(fields: Tuple[str, ...], redaction: str,
+                         separator: str) -> RedactionEngine:
+    """ Returns a cached RedactionEngine for the given settings """
+    return RedactionEngine(fields, redaction, separator)
+
+
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
     """ Returns a log message obfuscated """
-    for f in fields:
-        message = re.sub(f'{f}=.*?{separator}',
-                         f'{f}={redaction}{separator}', message)
-    return message
+    engine = get_redaction_engine(tuple(fields), redaction, separator)
+    return engine.redact(message)
+
+
+def is_structured(record: logging.LogRecord) -> bool:
+    """
+    Returns True if the record carries its data as a mapping message,
+    mapping args, or a row tuple message with a `columns` extra
+    """
+    if isinstance(record.msg, Mapping) or isinstance(record.args, Mapping):
+        return True
+    return (isinstance(record.msg, (tuple, list))
+            and getattr(record, "columns", None) is not None)
 
 
 def get_logger() -> logging.Logger:
-    """ Returns a Logger Object """
+    """
+    Returns a Logger Object
+    Setting PERSONAL_DATA_LOG_ASYNC=1 swaps the StreamHandler for an
+    AsyncRedactingHandler, sized by PERSONAL_DATA_LOG_QUEUE_SIZE and
+    using the PERSONAL_DATA_LOG_OVERFLOW policy.
+    """
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
-    stream_handler = logging.StreamHandler()
+    if environ.get("PERSONAL_DATA_LOG_ASYNC", "").lower() in ("1", "true"):
+        try:
+            capacity = int(environ.get("PERSONAL_DATA_LOG_QUEUE_SIZE",
+                                       AsyncRedactingHandler.CAPACITY))
+        except ValueError:
+            capacity = AsyncRedactingHandler.CAPACITY
+        overflow = environ.get("PERSONAL_DATA_LOG_OVERFLOW", "block")
+        stream_handler = AsyncRedactingHandler(capacity=capacity,
+                                               overflow=overflow)
+    else:
+        stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(RedactingFormatter(list(PII_FIELDS)))
     logger.addHandler(stream_handler)
 
     return logger
 
 
+def _db_config() -> dict:
+    """ Returns the connection settings from PERSONAL_DATA_DB_* """
+    config = {
+        "user": environ.get("PERSONAL_DATA_DB_USERNAME", "root"),
+        "password": environ.get("PERSONAL_DATA_DB_PASSWORD", ""),
+        "host": environ.get("PERSONAL_DATA_DB_HOST", "localhost"),
+        "database": environ.get("PERSONAL_DATA_DB_NAME"),
+    }
+    port = environ.get("PERSONAL_DATA_DB_PORT")
+    if port:
+        config["port"] = int(port)
+    return config
+
+
 def get_db() -> mysql.connector.connection.MySQLConnection:
     """ Returns a connector to a MySQL database """
-    username = environ.get("PERSONAL_DATA_DB_USERNAME", "root")
-    password = environ.get("PERSONAL_DATA_DB_PASSWORD", "")
-    host = environ.get("PERSONAL_DATA_DB_HOST", "localhost")
-    db_name = environ.get("PERSONAL_DATA_DB_NAME")
-
-    cnx = mysql.connector.connection.MySQLConnection(user=username,
-                                                     password=password,
-                                                     host=host,
-                                                     database=db_name)
+    cnx = mysql.connector.connection.MySQLConnection(**_db_config())
     return cnx
 
 
+DB_POOL_SIZE = 5
+# mysql-connector refuses pools larger than CNX_POOL_MAXSIZE (32)
+DB_POOL_MAX_SIZE = 32
+DB_POOL_TIMEOUT = 5.0
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db_pool() -> mysql.connector.pooling.MySQLConnectionPool:
+    """
+    Returns the process-wide connection pool, creating it on first use.
+    Its size comes from PERSONAL_DATA_DB_POOL_SIZE, clamped to
+    1..DB_POOL_MAX_SIZE, and sessions are reset whenever a connection
+    goes back to the pool.
+    """
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            try:
+                size = int(environ.get("PERSONAL_DATA_DB_POOL_SIZE",
+                                       DB_POOL_SIZE))
+            except ValueError:
+                size = DB_POOL_SIZE
+            size = min(max(size, 1), DB_POOL_MAX_SIZE)
+            _db_pool = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name="personal_data", pool_size=size,
+                pool_reset_session=True, **_db_config())
+        return _db_pool
+
+
+def get_pooled_db(timeout: float = None) \
+        -> mysql.connector.pooling.PooledMySQLConnection:
+    """
+    Returns a connection borrowed from the pool; closing it hands it back.
+    Waits up to `timeout` seconds (PERSONAL_DATA_DB_POOL_TIMEOUT by
+    default) for a free connection before raising PoolError.
+    """
+    if timeout is None:
+        try:
+            timeout = float(environ.get("PERSONAL_DATA_DB_POOL_TIMEOUT",
+                                        DB_POOL_TIMEOUT))
+        except ValueError:
+            timeout = DB_POOL_TIMEOUT
+    pool = get_db_pool()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return pool.get_connection()
+        except mysql.connector.errors.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.01)
+
+
+@contextmanager
+def pooled_db(timeout: float = None) \
+        -> Iterator[mysql.connector.pooling.PooledMySQLConnection]:
+    """ Lends a pooled connection for the duration of a with block """
+    cnx = get_pooled_db(timeout)
+    try:
+        yield cnx
+    finally:
+        cnx.close()
+
+
+def format_row(row: Sequence, field_names: Sequence[str]) -> str:
+    """ Returns a users row as a `field=value;` log message """
+    return '; '.join(f'{f}={r}' for r, f in zip(row, field_names)) + ';'
+
+
+def _render_batch(rows: List[Sequence], field_names: List[str]) -> str:
+    """
+    Renders a batch of users rows, PII columns masked, as log lines
+    sharing one prefix (and timestamp); runs in worker processes too
+    """
+    formatter = RedactingFormatter(list(PII_FIELDS))
+    record = logging.LogRecord("user_data", logging.INFO, __file__,
+                               0, "", None, None)
+    prefix = formatter.format(record)
+    block = '\n'.join(prefix + formatter.render_row(row, field_names)
+                      for row in rows)
+    return block + '\n'
+
+
+def export_users(db: mysql.connector.connection.MySQLConnection,
+                 batch_size: int = 1000, stream: TextIO = None) -> int:
+    """
+    Streams the users table in batches of `batch_size` rows through an
+    unbuffered cursor, and writes each batch, with its PII columns masked,
+    in a single write using the same line format as the user_data logger.
+    Returns the number of rows exported.
+    """
+    if stream is None:
+        stream = sys.stderr
+    cursor = db.cursor(buffered=False)
+    cursor.execute("SELECT * FROM users;")
+    field_names = [i[0] for i in cursor.description]
+
+    count = 0
+    try:
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            stream.write(_render_batch(rows, field_names))
+            stream.flush()
+            count += len(rows)
+            rows = cursor.fetchmany(batch_size)
+    finally:
+        cursor.close()
+    return count
+
+
+PARALLEL_MIN_ROWS = 50000
+
+
+def export_users_parallel(db: mysql.connector.connection.MySQLConnection,
+                          workers: int = None, chunk_size: int = 1000,
+                          stream: TextIO = None,
+                          min_rows: int = PARALLEL_MIN_ROWS) -> int:
+    """
+    Like export_users, but renders the chunks on a pool of `workers`
+    processes (one per CPU by default) and writes them in table order.
+    Tables smaller than `min_rows` are exported in-process.
+    Returns the number of rows exported.
+    """
+    if stream is None:
+        stream = sys.stderr
+    cursor = db.cursor()
+    cursor.execute("SELECT COUNT(*) FROM users;")
+    total = cursor.fetchone()[0]
+    cursor.close()
+
+    workers = workers or cpu_count() or 1
+    if workers < 2 or total < min_rows:
+        return export_users(db, chunk_size, stream)
+
+    cursor = db.cursor(buffered=False)
+    cursor.execute("SELECT * FROM users;")
+    field_names = [i[0] for i in cursor.description]
+
+    count = 0
+    pending = deque()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = cursor.fetchmany(chunk_size)
+            while rows:
+                pending.append(executor.submit(_render_batch, rows,
+                                               field_names))
+                count += len(rows)
+                # Bound the chunks in flight; write them back in order
+                if len(pending) >= workers * 2:
+                    stream.write(pending.popleft().result())
+                rows = cursor.fetchmany(chunk_size)
+            while pending:
+                stream.write(pending.popleft().result())
+    finally:
+        cursor.close()
+    stream.flush()
+    return count
+
+
 def main():
     """
     Obtain a database connection using get_db and retrieves all rows
-    in the users table and display each row under a filtered format
+    in the users table and display each row under a filtered format.
+    When PERSONAL_DATA_EXPORT_BATCH_SIZE is set, rows are streamed in
+    batches of that size with export_users instead, and when
+    PERSONAL_DATA_EXPORT_WORKERS is above 1 they are rendered on that
+    many processes with export_users_parallel.
     """
+    try:
+        batch_size = int(environ.get("PERSONAL_DATA_EXPORT_BATCH_SIZE", 0))
+    except ValueError:
+        batch_size = 0
+    try:
+        workers = int(environ.get("PERSONAL_DATA_EXPORT_WORKERS", 0))
+    except ValueError:
+        workers = 0
+
     db = get_db()
+    if workers > 1:
+        export_users_parallel(db, workers, batch_size or 1000)
+        db.close()
+        return
+    if batch_size > 0:
+        export_users(db, batch_size)
+        db.close()
+        return
+
     cursor = db.cursor()
     cursor.execute("SELECT * FROM users;")
     field_names = [i[0] for i in cursor.description]
@@ -61,8 +318,7 @@ def main():
     logger = get_logger()
 
     for row in cursor:
-        str_row = ''.join(f'{f}={str(r)}; ' for r, f in zip(row, field_names))
-        logger.info(str_row.strip())
+        logger.info(row, extra={"columns": field_names})
 
     cursor.close()
     db.close()
@@ -79,13 +335,174 @@ class RedactingFormatter(logging.Formatter):
     def __init__(self, fields: List[str]):
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self._field_set = frozenset(fields)
+        self._engine = get_redaction_engine(tuple(fields), self.REDACTION,
+                                            self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
-        """ Filters values in incoming log records using filter_datum """
-        record.msg = filter_datum(self.fields, self.REDACTION,
-                                  record.getMessage(), self.SEPARATOR)
+        """
+        Filters values in incoming log records.
+        Structured records (a mapping message, a row tuple message with
+        a `columns` extra, or mapping args) have their PII values masked
+        by key and are rendered once; plain string messages go through
+        filter_datum.
+        """
+        if is_structured(record):
+            record.msg = self._render(record)
+            record.args = None
+        else:
+            record.msg = self._engine.redact(record.getMessage())
         return super(RedactingFormatter, self).format(record)
 
+    def _mask(self, data: Mapping) -> dict:
+        """ Returns a copy of data with the values of PII keys redacted """
+        fields = self._field_set
+        return {k: self.REDACTION if k in fields else v
+                for k, v in data.items()}
+
+    def _render(self, record: logging.LogRecord) -> str:
+        """ Renders a structured record with its PII values masked """
+        if isinstance(record.msg, Mapping):
+            data = self._mask(record.msg)
+            return format_row(data.values(), data.keys())
+        if isinstance(record.args, Mapping):
+            return str(record.msg) % self._mask(record.args)
+        return self.render_row(record.msg, record.columns)
+
+    def render_row(self, row: Sequence, columns: Sequence[str]) -> str:
+        """ Renders a row as `field=value;` with its PII columns masked """
+        fields = self._field_set
+        values = [self.REDACTION if f in fields else v
+                  for v, f in zip(row, columns)]
+        return format_row(values, columns)
+
+    def redact(self, message: str) -> str:
+        """ Obfuscates the configured fields of a message """
+        return self._engine.redact(message)
+
+
+class AsyncRedactingHandler(logging.Handler):
+    """ Handler that queues records and has a background thread
+        redact and write them, so the logging caller never does
+        the regex work or the stream I/O
+        """
+
+    CAPACITY = 10000
+    OVERFLOW_POLICIES = ("block", "drop_oldest", "drop")
+    terminator = "\n"
+
+    def __init__(self, stream: TextIO = None, capacity: int = CAPACITY,
+                 overflow: str = "block"):
+        """
+        Args:
+            stream: sink for the redacted lines, sys.stderr by default.
+            capacity: maximum number of records waiting in the queue.
+            overflow: what to do when the queue is full, one of
+                "block" (wait for room), "drop_oldest" (discard the
+                oldest queued record) or "drop" (discard the new record).
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}")
+        super(AsyncRedactingHandler, self).__init__()
+        self.stream = stream if stream is not None else sys.stderr
+        self.overflow = overflow
+        self.queued = 0
+        self.dropped = 0
+        self.written = 0
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max(capacity, 1))
+        self._worker = threading.Thread(target=self._run,
+                                        name="user_data-log-writer",
+                                        daemon=True)
+        self._worker.start()
+
+    def _count(self, counter: str):
+        """ Increments one of the queued/dropped/written counters """
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def emit(self, record: logging.LogRecord):
+        """ Queues the record according to the overflow policy """
+        if self._closed:
+            self._count("dropped")
+            return
+        try:
+            # Snapshot the data now: it may be mutated before the worker runs
+            if isinstance(record.msg, Mapping):
+                record.msg = dict(record.msg)
+            elif isinstance(record.args, Mapping):
+                record.args = dict(record.args)
+            elif is_structured(record):
+                record.msg = tuple(record.msg)
+            else:
+                record.msg = record.getMessage()
+                record.args = None
+        except Exception:
+            self.handleError(record)
+            return
+
+        if self.overflow == "block":
+            self._queue.put(record)
+        elif self.overflow == "drop_oldest":
+            while True:
+                try:
+                    self._queue.put_nowait(record)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self._queue.task_done()
+                        self._count("dropped")
+                    except queue.Empty:
+                        pass
+        else:
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self._count("dropped")
+                return
+        self._count("queued")
+
+    def _run(self):
+        """ Worker loop: redacts and writes records until the sentinel """
+        while True:
+            record = self._queue.get()
+            try:
+                if record is None:
+                    return
+                try:
+                    self.stream.write(self.format(record) + self.terminator)
+                    if self._queue.empty():
+                        self.stream.flush()
+                    self._count("written")
+                except Exception:
+                    self.handleError(record)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, int]:
+        """ Returns the queued/dropped/written counters """
+        with self._stats_lock:
+            return {"queued": self.queued,
+                    "dropped": self.dropped,
+                    "written": self.written}
+
+    def flush(self):
+        """ Blocks until every queued record has been written """
+        if self._worker.is_alive():
+            self._queue.join()
+        self.stream.flush()
+
+    def close(self):
+        """ Drains the queue and stops the worker thread """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+            self.stream.flush()
+        super(AsyncRedactingHandler, self).close()
+
 
 if __name__ == '__main__':
     main()
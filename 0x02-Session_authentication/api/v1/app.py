@@ -39,6 +39,20 @@ elif AUTH_TYPE == 'session_db_auth':
     # Use session authentication stored in the database
     auth = SessionDBAuth()
 
+# Report per-request auth backend runs in an X-Auth-Runs header
+AUTH_RUN_COUNTERS = os.getenv("AUTH_RUN_COUNTERS", "") not in ("", "0")
+
+# Routes that do not require authentication, compiled once at startup;
+# AUTH_EXCLUDED_PATHS or AUTH_EXCLUDED_PATHS_FILE replace them
+EXCLUDED_PATHS = None
+if auth is not None:
+    from api.v1.auth.auth import PathMatcher, load_excluded_paths
+    EXCLUDED_PATHS = PathMatcher(load_excluded_paths([
+        '/api/v1/status/',
+        '/api/v1/unauthorized/',
+        '/api/v1/forbidden/',
+        '/api/v1/auth_session/login/']))
+
 
 @app.before_request
 def before_request():
@@ -47,30 +61,39 @@ def before_request():
     Sets the current user for the request if authentication is enabled,
     and aborts with appropriate error codes if access is unauthorized
     or forbidden. If `auth` is not set, all requests pass through
-    without authentication checks.
+    without authentication checks. The user is resolved once per
+    request, and never for excluded routes.
     """
     if auth is None:
         # No authentication configured, so skip checks
         pass
+    elif not auth.require_auth(request.path, EXCLUDED_PATHS):
+        # Excluded routes do not run the auth backend at all
+        setattr(request, "current_user", None)
     else:
+        cookie = auth.session_cookie(request)
+        # Abort with 401 if neither header nor session cookie is present
+        if auth.authorization_header(request) is None and cookie is None:
+            abort(401, description="Unauthorized")
         # Set current user in request object for use in API views
-        setattr(request, "current_user", auth.current_user(request))
-
-        # Define routes that do not require authentication
-        excluded_list = ['/api/v1/status/',
-                         '/api/v1/unauthorized/',
-                         '/api/v1/forbidden/',
-                         '/api/v1/auth_session/login/']
-
-        # Check if the request path requires authentication
-        if auth.require_auth(request.path, excluded_list):
-            cookie = auth.session_cookie(request)
-            # Abort with 401 if neither header nor session cookie is present
-            if auth.authorization_header(request) is None and cookie is None:
-                abort(401, description="Unauthorized")
-            # Abort with 403 if current user could not be authenticated
-            if auth.current_user(request) is None:
-                abort(403, description='Forbidden')
+        setattr(request, "current_user", auth.request_user(request))
+        # Abort with 403 if current user could not be authenticated
+        if request.current_user is None:
+            abort(403, description='Forbidden')
+
+
+@app.after_request
+def after_request(response):
+    """
+    Function executed after each request.
+    When AUTH_RUN_COUNTERS is set, reports in the X-Auth-Runs header how
+    many times each auth backend ran for the request.
+    """
+    if auth is not None and AUTH_RUN_COUNTERS:
+        response.headers["X-Auth-Runs"] = ",".join(
+            "{}={}".format(name, count)
+            for name, count in auth.auth_runs().items())
+    return response
 
 
 @app.errorhandler(404)
@@ -6,47 +6,129 @@ for managing authentication, including authorization checks,
 session cookies, and retrieving the authorization header.
 """
 
-from typing import List, TypeVar
-from flask import request
+from functools import lru_cache
+from typing import Iterable, List, Tuple, TypeVar, Union
+from flask import g, has_request_context, request
 import os
 
 
+def _strip_slash(path: str) -> str:
+    """ Returns the path without one trailing slash """
+    return path[:-1] if path.endswith("/") else path
+
+
+class PathMatcher:
+    """Exclusion rules compiled once for `Auth.require_auth`.
+    A rule ending in "*" matches every path starting with what precedes
+    the "*"; any other rule matches the path with or without a trailing
+    slash. Exact rules are kept in a set and wildcard prefixes in a
+    character trie, so matching costs the same however many rules there
+    are.
+    """
+
+    def __init__(self, rules: Iterable[str]):
+        """
+        Compiles the exclusion rules.
+        Args:
+            rules (Iterable[str]): Exact paths and "*"-terminated prefixes.
+        """
+        self.rules = tuple(rules)
+        self._exact = set()
+        self._prefixes = {}
+        for rule in self.rules:
+            if rule.endswith("*"):
+                node = self._prefixes
+                for char in rule[:-1]:
+                    node = node.setdefault(char, {})
+                node[None] = True  # a wildcard rule ends here
+            else:
+                self._exact.add(_strip_slash(rule))
+
+    def __len__(self) -> int:
+        """ Returns the number of rules """
+        return len(self.rules)
+
+    def matches(self, path: str) -> bool:
+        """
+        Checks a path against the rules.
+        Args:
+            path (str): The request path.
+        Returns:
+            bool: True if a rule excludes the path, False otherwise.
+        """
+        if _strip_slash(path) in self._exact:
+            return True
+        node = self._prefixes
+        for char in path:
+            if None in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return None in node
+
+
+@lru_cache(maxsize=64)
+def compile_excluded_paths(rules: Tuple[str, ...]) -> PathMatcher:
+    """
+    Returns the matcher of a rule set, compiled once per rule set.
+    Args:
+        rules (Tuple[str, ...]): The exclusion rules.
+    Returns:
+        PathMatcher: The compiled rules.
+    """
+    return PathMatcher(rules)
+
+
+def load_excluded_paths(default: Iterable[str]) -> List[str]:
+    """
+    Reads the exclusion rules from the environment.
+    AUTH_EXCLUDED_PATHS_FILE names a file with one rule per line (blank
+    lines and lines starting with "#" are skipped); AUTH_EXCLUDED_PATHS
+    holds comma separated rules.
+    Args:
+        default (Iterable[str]): Rules used when neither is set.
+    Returns:
+        List[str]: The exclusion rules.
+    """
+    file_path = os.getenv("AUTH_EXCLUDED_PATHS_FILE")
+    if file_path:
+        with open(file_path) as f:
+            lines = (line.strip() for line in f)
+            return [line for line in lines
+                    if line and not line.startswith("#")]
+    rules = os.getenv("AUTH_EXCLUDED_PATHS")
+    if rules is not None:
+        return [rule.strip() for rule in rules.split(",") if rule.strip()]
+    return list(default)
+
+
 class Auth:
     """Authentication class to manage various aspects of user authentication,
     including path access control, header validation, and session management.
     """
 
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathMatcher]) -> bool:
         """
         Determines if a given path requires authentication.
         Args:
             path (str): The path to check.
-            excluded_paths (List[str]):
-            List of paths that do not require authentication.
+            excluded_paths (Union[List[str], PathMatcher]):
+            Paths that do not require authentication, as a list of rules
+            or already compiled.
         Returns:
             bool: True if the path requires authentication, False otherwise.
         """
         if path is None:
             return True
 
-        if excluded_paths is None or excluded_paths == []:
+        if not excluded_paths:
             return True
 
-        # Exact match with an excluded path
-        if path in excluded_paths:
-            return False
-
-        # Check for prefix or wildcard matches in excluded paths
-        for excluded_path in excluded_paths:
-            if excluded_path.startswith(path):
-                return False
-            elif path.startswith(excluded_path):
-                return False
-            elif excluded_path[-1] == "*":
-                if path.startswith(excluded_path[:-1]):
-                    return False
-
-        return True
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = compile_excluded_paths(tuple(excluded_paths))
+        return not excluded_paths.matches(path)
 
     def authorization_header(self, request=None) -> str:
         """
@@ -76,8 +158,47 @@ class Auth:
         Returns:
             TypeVar('User'): Always returns None in this base class.
         """
+        self.count_run()
         return None
 
+    def request_user(self, request=None) -> TypeVar('User'):
+        """
+        Retrieves the current user of the request being handled, running
+        `current_user` at most once per request: the result is kept on
+        flask.g so before_request, views and subclasses share it.
+        Args:
+            request (Request, optional): The Flask request object.
+            Defaults to None.
+        Returns:
+            TypeVar('User'): The authenticated user, or None.
+        """
+        if not has_request_context():
+            return self.current_user(request)
+        if "auth_user" not in g:
+            g.auth_user = self.current_user(request)
+        return g.auth_user
+
+    def count_run(self):
+        """
+        Counts a run of this backend's `current_user` in the current
+        request; `auth_runs` returns the counters.
+        """
+        if has_request_context():
+            runs = g.setdefault("auth_runs", {})
+            name = type(self).__name__
+            runs[name] = runs.get(name, 0) + 1
+
+    @staticmethod
+    def auth_runs() -> dict:
+        """
+        Returns how many times each auth backend ran in this request.
+        Returns:
+            dict: Backend class name -> number of `current_user` runs.
+        """
+        if not has_request_context():
+            return {}
+        return dict(g.get("auth_runs", {}))
+
     def session_cookie(self, request=None):
         """
         Retrieves the session cookie from the request.
@@ -4,9 +4,16 @@ Module for authentication using Basic auth
 """
 
 
+from collections import OrderedDict
 from typing import TypeVar
 from api.v1.auth.auth import Auth
 import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
 
 from models.user import User
 
@@ -15,6 +22,81 @@ class BasicAuth(Auth):
     """_summary_
     """
 
+    def __init__(self):
+        """
+        Initialize the verified-credential cache.
+        BASIC_AUTH_CACHE_SIZE bounds the number of cached headers
+        (0 disables the cache) and BASIC_AUTH_CACHE_TTL is the number
+        of seconds an entry stays valid.
+        """
+        try:
+            self.cache_size = int(os.getenv('BASIC_AUTH_CACHE_SIZE', 1024))
+        except ValueError:
+            self.cache_size = 1024
+        try:
+            self.cache_ttl = float(os.getenv('BASIC_AUTH_CACHE_TTL', 60))
+        except ValueError:
+            self.cache_ttl = 60.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Keyed digest of the header -> (user id, updated_at, expiry);
+        # the per-process key means the raw credentials are never kept
+        self._cache = OrderedDict()
+        self._cache_key = secrets.token_bytes(32)
+        self._cache_lock = threading.Lock()
+
+    def _header_digest(self, authorization_header: str) -> bytes:
+        """
+        Returns the keyed digest used as cache key for a header.
+        """
+        return hmac.new(self._cache_key, authorization_header.encode(),
+                        hashlib.sha256).digest()
+
+    def _cached_user(self, digest: bytes) -> TypeVar('User'):
+        """
+        Returns the user cached for a header digest, or None.
+        Entries past their TTL, or whose user was removed or saved
+        (which is how a password change is persisted) since it was
+        cached, are dropped.
+        """
+        with self._cache_lock:
+            entry = self._cache.get(digest)
+            if entry is None:
+                return None
+            user_id, updated_at, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._cache[digest]
+                return None
+            self._cache.move_to_end(digest)
+
+        user = User.get(user_id)
+        if user is None or user.updated_at != updated_at:
+            with self._cache_lock:
+                self._cache.pop(digest, None)
+            return None
+        return user
+
+    def _cache_user(self, digest: bytes, user: TypeVar('User')):
+        """
+        Caches an authenticated user, evicting the least recently used
+        entry when the cache is full.
+        """
+        with self._cache_lock:
+            self._cache[digest] = (user.id, user.updated_at,
+                                   time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def cache_stats(self) -> dict:
+        """
+        Returns the hit/miss counters and size of the credential cache.
+        """
+        with self._cache_lock:
+            return {"hits": self.cache_hits,
+                    "misses": self.cache_misses,
+                    "size": len(self._cache)}
+
     def extract_base64_authorization_header(self,
                                             authorization_header: str) -> str:
         """_summary_
@@ -101,7 +183,28 @@ class BasicAuth(Auth):
     def current_user(self, request=None) -> TypeVar('User'):
         """_summary_
         """
+        self.count_run()
         auth_header = self.authorization_header(request)
+        if auth_header is not None and self.cache_size > 0:
+            digest = self._header_digest(auth_header)
+            user = self._cached_user(digest)
+            with self._cache_lock:
+                if user is not None:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            if user is None:
+                user = self._authenticate(auth_header)
+                if user is not None:
+                    self._cache_user(digest, user)
+            return user
+
+        return self._authenticate(auth_header)
+
+    def _authenticate(self, auth_header: str) -> TypeVar('User'):
+        """
+        Runs the full Basic auth pipeline on an Authorization header.
+        """
         if auth_header is not None:
             token = self.extract_base64_authorization_header(auth_header)
             if token is not None:
@@ -5,16 +5,28 @@ Module for authentication using Session auth
 
 
 from .auth import Auth
+from .session_store import SessionStore, session_store_from_env
 
 from models.user import User
 from uuid import uuid4
+import time
 
 
 class SessionAuth(Auth):
     """_summary_
     """
+    # Sessions of the "memory" store: session ID -> (user_id, created_at)
     user_id_by_session_id = {}
 
+    def __init__(self, store: SessionStore = None):
+        """
+        Initialize the session store, the one selected by SESSION_STORE
+        unless a store is given.
+        """
+        if store is None:
+            store = session_store_from_env(self.user_id_by_session_id)
+        self.store = store
+
     def create_session(self, user_id: str = None) -> str:
         """_summary_
 
@@ -27,9 +39,9 @@ class SessionAuth(Auth):
         if user_id is None or not isinstance(user_id, str):
             return None
 
-        id = uuid4()
-        self.user_id_by_session_id[str(id)] = user_id
-        return str(id)
+        id = str(uuid4())
+        self.store.set(id, user_id, time.time())
+        return id
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """_summary_
@@ -42,7 +54,8 @@ class SessionAuth(Auth):
         """
         if session_id is None or not isinstance(session_id, str):
             return None
-        return self.user_id_by_session_id.get(session_id)
+        session = self.store.get(session_id)
+        return None if session is None else session[0]
 
     def current_user(self, request=None):
         """_summary_
@@ -50,6 +63,7 @@ class SessionAuth(Auth):
         Args:
             request (_type_, optional): _description_. Defaults to None.
         """
+        self.count_run()
         session_cookie = self.session_cookie(request)
         user_id = self.user_id_for_session_id(session_cookie)
         user = User.get(user_id)
@@ -72,5 +86,5 @@ class SessionAuth(Auth):
         user_id = self.user_id_for_session_id(session_cookie)
         if user_id is None:
             return False
-        del self.user_id_by_session_id[session_cookie]
+        self.store.delete(session_cookie)
         return True
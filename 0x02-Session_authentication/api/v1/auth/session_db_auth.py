@@ -2,9 +2,15 @@
 """
 SessionDBAuth module for session authentication stored in the database.
 """
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import os
+import threading
+import time
 
 from api.v1.auth.session_exp_auth import SessionExpAuth
+from api.v1.auth.session_store import SessionStore
 from models.user_session import UserSession
 
 
@@ -15,6 +21,125 @@ class SessionDBAuth(SessionExpAuth):
     Inherits from SessionExpAuth to support session expiration.
     """
 
+    def __init__(self, store: SessionStore = None):
+        """
+        Initialize the read-through session cache.
+        SESSION_DB_CACHE_SIZE bounds the number of cached session IDs
+        (0 disables the cache), SESSION_DB_CACHE_TTL is the number of
+        seconds a found session stays cached and SESSION_DB_NEGATIVE_TTL
+        the number of seconds an unknown session ID does.
+        Expired UserSession records are removed now, then by the sweeper
+        at most every SESSION_DB_GC_INTERVAL seconds.
+        """
+        # Set before the sweeper thread, started on first use, calls sweep()
+        try:
+            self.gc_interval = float(os.getenv('SESSION_DB_GC_INTERVAL', 600))
+        except ValueError:
+            self.gc_interval = 600.0
+        self.sessions_reclaimed = 0
+        self._next_gc = time.monotonic() + self.gc_interval
+        super().__init__(store)
+        try:
+            self.cache_size = int(os.getenv('SESSION_DB_CACHE_SIZE', 1024))
+        except ValueError:
+            self.cache_size = 1024
+        try:
+            self.cache_ttl = float(os.getenv('SESSION_DB_CACHE_TTL', 30))
+        except ValueError:
+            self.cache_ttl = 30.0
+        try:
+            self.negative_ttl = float(
+                os.getenv('SESSION_DB_NEGATIVE_TTL', 5))
+        except ValueError:
+            self.negative_ttl = 5.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Session ID -> ((user_id, created_at) or None, expiry)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.collect_expired()
+
+    def collect_expired(self) -> int:
+        """
+        Removes the expired UserSession records from the database.
+        Returns:
+            int: Number of records reclaimed.
+        """
+        self._next_gc = time.monotonic() + self.gc_interval
+        reclaimed = UserSession.purge_expired(self.session_duration)
+        self.sessions_reclaimed += reclaimed
+        return reclaimed
+
+    def sweep(self, now: float = None) -> int:
+        """
+        Evicts expired sessions from the session store and, once per
+        gc_interval, reclaims expired records from the database.
+        Args:
+            now (float, optional): Current epoch time. Defaults to now.
+        Returns:
+            int: Number of sessions evicted from the session store.
+        """
+        evicted = super().sweep(now)
+        if time.monotonic() >= self._next_gc:
+            self.collect_expired()
+        return evicted
+
+    def session_metrics(self) -> dict:
+        """
+        Report the session counters, with the database records.
+        Returns:
+            dict: The SessionExpAuth counters, the stored UserSession
+            records and the records reclaimed.
+        """
+        metrics = super().session_metrics()
+        metrics["records"] = UserSession.count()
+        metrics["reclaimed"] = self.sessions_reclaimed
+        return metrics
+
+    def _lookup(self, session_id: str) -> Optional[Tuple[str, datetime]]:
+        """
+        Returns (user_id, created_at) of the stored UserSession, or None,
+        reading through the cache. The lookup is keyed on the
+        session_id index of UserSession.
+        """
+        if self.cache_size > 0:
+            with self._cache_lock:
+                entry = self._cache.get(session_id)
+                if entry is not None and entry[1] >= time.monotonic():
+                    self._cache.move_to_end(session_id)
+                    self.cache_hits += 1
+                    return entry[0]
+                self.cache_misses += 1
+
+        user_session = UserSession.find_by(session_id=session_id)
+        session = None
+        if user_session is not None:
+            session = (user_session.user_id, user_session.created_at)
+        if self.cache_size > 0:
+            ttl = self.cache_ttl if session is not None else self.negative_ttl
+            with self._cache_lock:
+                self._cache[session_id] = (session, time.monotonic() + ttl)
+                self._cache.move_to_end(session_id)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return session
+
+    def _invalidate(self, session_id: str):
+        """
+        Drops the cached lookup of a session ID.
+        """
+        with self._cache_lock:
+            self._cache.pop(session_id, None)
+
+    def cache_stats(self) -> dict:
+        """
+        Returns the hit/miss counters and size of the session cache.
+        """
+        with self._cache_lock:
+            return {"hits": self.cache_hits,
+                    "misses": self.cache_misses,
+                    "size": len(self._cache)}
+
     def create_session(self, user_id=None):
         """
         Creates a session for a user and stores it in the database.
@@ -30,7 +155,9 @@ class SessionDBAuth(SessionExpAuth):
 
         # Create a UserSession object and save it to the database
         user_session = UserSession(user_id=user_id, session_id=session_id)
-        user_session.save()  # Assuming a save method to persist data
+        user_session.save()
+        # Forget a negative lookup of this ID cached before it existed
+        self._invalidate(session_id)
 
         return session_id
 
@@ -44,22 +171,24 @@ class SessionDBAuth(SessionExpAuth):
         """
         if session_id is None:
             return None
+        self._start_sweeper()
 
-        # Fetch the UserSession object from the database by session_id
-        # Assuming find_by is a query method
-        user_session = UserSession.find_by(session_id=session_id)
-        if user_session is None:
+        # Fetch the session from the database by session_id, or the cache
+        session = self._lookup(session_id)
+        if session is None:
             return None
+        user_id, created_at = session
 
         # Check for expiration
         if self.session_duration <= 0:
-            return user_session.user_id
-        # Determine session expiration time
-        created_at = user_session.created_at
+            return user_id
+        # Determine session expiration time (created_at is in UTC)
         duration = timedelta(seconds=self.session_duration)
-        if created_at + duration < datetime.now():
+        if created_at + duration < datetime.utcnow():
             return None  # Session expired, return None
 
+        return user_id
+
     def destroy_session(self, request=None):
         """
         Destroys a session by deleting
@@ -82,6 +211,8 @@ class SessionDBAuth(SessionExpAuth):
         if user_session is None:
             return False
 
-        # using delete method to remove the record
-        user_session.delete()
+        # Remove the record from the database and every cached copy
+        user_session.remove()
+        self._invalidate(session_id)
+        self.store.delete(session_id)
         return True
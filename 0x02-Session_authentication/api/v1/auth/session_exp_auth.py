@@ -6,8 +6,11 @@ which adds expiration functionality to session authentication.
 """
 
 from api.v1.auth.session_auth import SessionAuth
-from datetime import datetime, timedelta
+from api.v1.auth.session_store import SessionStore
+from heapq import heappop, heappush
 import os
+import threading
+import time
 
 
 class SessionExpAuth(SessionAuth):
@@ -18,40 +21,142 @@ class SessionExpAuth(SessionAuth):
     Attributes:
         session_duration (int): Duration of session in seconds.
         Defaults to 0 (no expiration).
+        sweep_interval (float): Seconds between two background sweeps of
+        expired sessions (SESSION_SWEEP_INTERVAL, 0 disables the thread).
+        purge_interval (float): Seconds between two scans of the whole
+        store for expired sessions this instance does not track, such as
+        those of other workers or of a previous run
+        (SESSION_PURGE_INTERVAL).
+        sessions_evicted (int): Number of expired sessions removed.
     """
 
-    def __init__(self):
+    def __init__(self, store: SessionStore = None):
         """
         Initialize SessionExpAuth by setting the session_duration attribute.
         If SESSION_DURATION environment variable is set,
         it is used as the session duration.
         If it is not set or invalid, session_duration defaults to 0.
         """
+        super().__init__(store)
         try:
             self.session_duration = int(os.getenv('SESSION_DURATION', 0))
         except ValueError:
             self.session_duration = 0
+        try:
+            self.sweep_interval = float(
+                os.getenv('SESSION_SWEEP_INTERVAL', 60))
+        except ValueError:
+            self.sweep_interval = 60.0
+        try:
+            self.purge_interval = float(
+                os.getenv('SESSION_PURGE_INTERVAL', 600))
+        except ValueError:
+            self.purge_interval = 600.0
+        # The first sweep, when the sweeper starts, scans the whole store
+        self._next_purge = 0.0
+        # Min-heap of (expiration time, session ID) of the sessions
+        # created by this instance, so a sweep only visits expired ones
+        self._expirations = []
+        self._expirations_lock = threading.Lock()
+        self.sessions_evicted = 0
+        self.sweeps = 0
+        self._stop_sweeper = threading.Event()
+        self._sweeper = None
+        # The sweeper starts on first use in each process, so workers
+        # forked after the app is imported get their own thread
+        self._sweeper_pid = None
+
+    def _start_sweeper(self):
+        """ Start the background sweeper of the current process, once """
+        if self._sweeper_pid == os.getpid():
+            return
+        if self.session_duration <= 0 or self.sweep_interval <= 0:
+            return
+        with self._expirations_lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            self._stop_sweeper = threading.Event()
+            self._sweeper = threading.Thread(target=self._sweep_loop,
+                                             name="session-sweeper",
+                                             daemon=True)
+            self._sweeper.start()
 
     def create_session(self, user_id=None):
         """
-        Create a session with an expiration date for the specified user ID.
+        Create a session for the specified user ID and track when it
+        expires.
         Args:
             user_id (str): ID of the user for whom to create a session.
         Returns:
             str: Session ID if created, or None if session creation fails.
         """
-        # Call parent method to get session ID
+        self._start_sweeper()
         session_id = super().create_session(user_id)
-        if session_id is None:
-            return None
-
-        # Store session data with user_id and creation time
-        self.user_id_by_session_id[session_id] = {
-            "user_id": user_id,
-            "created_at": datetime.now()  # Record session creation time
-        }
+        if session_id is not None and self.session_duration > 0:
+            expires_at = time.time() + self.session_duration
+            with self._expirations_lock:
+                heappush(self._expirations, (expires_at, session_id))
         return session_id
 
+    def sweep(self, now: float = None) -> int:
+        """
+        Remove the expired sessions from the store, visiting only the
+        expired entries of the heap, and once per purge_interval every
+        expired session of the store.
+        Args:
+            now (float, optional): Current epoch time. Defaults to now.
+        Returns:
+            int: Number of sessions removed.
+        """
+        now = time.time() if now is None else now
+        evicted = 0
+        while True:
+            with self._expirations_lock:
+                if not self._expirations or self._expirations[0][0] > now:
+                    break
+                _, session_id = heappop(self._expirations)
+            session_data = self.store.get(session_id)
+            # Skip sessions already destroyed or recreated since
+            if session_data is not None \
+                    and session_data[1] + self.session_duration < now \
+                    and self.store.delete(session_id):
+                evicted += 1
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + self.purge_interval
+            evicted += self.store.purge_expired(now - self.session_duration)
+        with self._expirations_lock:
+            self.sessions_evicted += evicted
+            self.sweeps += 1
+        return evicted
+
+    def _sweep_loop(self):
+        """ Sweep expired sessions now, then every sweep_interval seconds
+        """
+        self.sweep()
+        while not self._stop_sweeper.wait(self.sweep_interval):
+            self.sweep()
+
+    def stop_sweeper(self):
+        """ Stop the background sweeper thread """
+        self._stop_sweeper.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+
+    def session_metrics(self) -> dict:
+        """
+        Report the session counters.
+        Returns:
+            dict: Stored sessions, sessions waiting to expire, sessions
+            evicted and sweeps run.
+        """
+        with self._expirations_lock:
+            return {"sessions": len(self.store),
+                    "expiring": len(self._expirations),
+                    "evicted": self.sessions_evicted,
+                    "sweeps": self.sweeps}
+
     def user_id_for_session_id(self, session_id=None):
         """
         Retrieve user ID associated with a session ID,
@@ -64,23 +169,25 @@ class SessionExpAuth(SessionAuth):
         """
         if session_id is None:
             return None
+        self._start_sweeper()
 
-        session_data = self.user_id_by_session_id.get(session_id)
+        # The store records the user_id and creation time of the session
+        session_data = self.store.get(session_id)
         if session_data is None:
             return None
+        user_id, created_at = session_data
 
         # Check if session duration is set and handle expiration logic
         if self.session_duration <= 0:
             # No expiration, return user_id directly
-            return session_data.get("user_id")
-
-        created_at = session_data.get("created_at")
-        if created_at is None:
-            return None
+            return user_id
 
         # Calculate expiration time and compare with current time
-        if (created_at + timedelta(seconds=self.session_duration)
-                < datetime.now()):
-            return None  # Session expired, return None
+        if created_at + self.session_duration < time.time():
+            # Session expired: drop it now rather than at the next sweep
+            if self.store.delete(session_id):
+                with self._expirations_lock:
+                    self.sessions_evicted += 1
+            return None
 
-        return session_data.get("user_id")
+        return user_id
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Module of session stores
+A session store maps a session ID to the user ID and creation time
+(epoch seconds) of the session. SessionAuth and its subclasses keep
+their sessions in the store selected by SESSION_STORE:
+  - "memory" (default): a dict inside the process
+  - "sqlite": an SQLite file in WAL mode, shared by every process
+  - "mmap": a fixed-size hash table in a memory-mapped file, shared by
+    every process on the host
+SESSION_STORE_PATH names the file of the shared stores and
+SESSION_STORE_CAPACITY the number of slots of the mmap table.
+"""
+import fcntl
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+
+class SessionStore:
+    """Interface of the session stores.
+    """
+
+    def get(self, session_id: str) -> Optional[Tuple[str, float]]:
+        """
+        Retrieves a session.
+        Args:
+            session_id (str): The session ID.
+        Returns:
+            Optional[Tuple[str, float]]: (user_id, created_at) of the
+            session, or None if there is no such session.
+        """
+        raise NotImplementedError
+
+    def set(self, session_id: str, user_id: str, created_at: float):
+        """
+        Stores a session, replacing any session with the same ID.
+        Args:
+            session_id (str): The session ID.
+            user_id (str): The ID of the session's user.
+            created_at (float): Creation time in epoch seconds.
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Removes a session.
+        Args:
+            session_id (str): The session ID.
+        Returns:
+            bool: True if the session existed, False otherwise.
+        """
+        raise NotImplementedError
+
+    def purge_expired(self, cutoff: float) -> int:
+        """
+        Removes every session created before a time, including the
+        sessions other processes created.
+        Args:
+            cutoff (float): Epoch time; older sessions are removed.
+        Returns:
+            int: Number of sessions removed.
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        """ Returns the number of stored sessions """
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions kept in a dict of the current process.
+    """
+
+    def __init__(self, sessions: Dict[str, Tuple[str, float]] = None):
+        """
+        Args:
+            sessions (dict, optional): The dict to keep sessions in.
+        """
+        self.sessions = {} if sessions is None else sessions
+
+    def get(self, session_id: str) -> Optional[Tuple[str, float]]:
+        """ Retrieves a session """
+        return self.sessions.get(session_id)
+
+    def set(self, session_id: str, user_id: str, created_at: float):
+        """ Stores a session """
+        self.sessions[session_id] = (user_id, created_at)
+
+    def delete(self, session_id: str) -> bool:
+        """ Removes a session """
+        return self.sessions.pop(session_id, None) is not None
+
+    def purge_expired(self, cutoff: float) -> int:
+        """ Removes every session created before cutoff """
+        removed = 0
+        for session_id, (_, created_at) in list(self.sessions.items()):
+            if created_at < cutoff \
+                    and self.sessions.pop(session_id, None) is not None:
+                removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        """ Returns the number of stored sessions """
+        return len(self.sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions kept in an SQLite file in WAL mode, so readers in every
+    process proceed while one of them writes. Each thread uses its own
+    connection, and a process forked after the store was opened makes
+    new ones, as SQLite connections must not cross a fork.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Args:
+            file_path (str): Path of the SQLite file.
+        """
+        self.file_path = file_path
+        self._local = threading.local()
+        with self._connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS sessions ("
+                       "session_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+                       "created_at REAL NOT NULL) WITHOUT ROWID")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_created_at "
+                       "ON sessions (created_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """ Returns the connection of the current thread and process """
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.file_path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def get(self, session_id: str) -> Optional[Tuple[str, float]]:
+        """ Retrieves a session """
+        row = self._connection().execute(
+            "SELECT user_id, created_at FROM sessions WHERE session_id = ?",
+            (session_id,)).fetchone()
+        return None if row is None else (row[0], row[1])
+
+    def set(self, session_id: str, user_id: str, created_at: float):
+        """ Stores a session """
+        with self._connection() as db:
+            db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                       (session_id, user_id, created_at))
+
+    def delete(self, session_id: str) -> bool:
+        """ Removes a session """
+        with self._connection() as db:
+            cursor = db.execute("DELETE FROM sessions WHERE session_id = ?",
+                                (session_id,))
+        return cursor.rowcount > 0
+
+    def purge_expired(self, cutoff: float) -> int:
+        """ Removes every session created before cutoff """
+        with self._connection() as db:
+            cursor = db.execute("DELETE FROM sessions WHERE created_at < ?",
+                                (cutoff,))
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        """ Returns the number of stored sessions """
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class MmapSessionStore(SessionStore):
+    """Sessions kept in an open-addressing hash table (linear probing)
+    in a memory-mapped file. Every process mapping the file sees the
+    same sessions; an flock on the file serializes writers against
+    readers. Deletes shift the following entries back instead of leaving
+    tombstones, so probes stay short however many sessions come and go,
+    and the table doubles (every process remaps it) once more than
+    MAX_LOAD of its slots are used. A process forked after the store
+    was opened reopens the file: flock only excludes separate open file
+    descriptions. Session and user IDs are limited to KEY_SIZE bytes.
+    """
+
+    MAGIC = b"SES2"
+    HEADER = struct.Struct("<4sII")  # magic, capacity, used slots
+    KEY_SIZE = 64
+    # state, session_id length, session_id, user_id length, user_id,
+    # created_at
+    SLOT = struct.Struct("<BB64sB64sd")
+    EMPTY, USED = 0, 1
+    MAX_LOAD = 0.75
+
+    def __init__(self, file_path: str, capacity: int = 16384):
+        """
+        Args:
+            file_path (str): Path of the table file, created if missing.
+            capacity (int): Number of slots of a new table; an existing
+            file keeps its own capacity.
+        """
+        self.file_path = file_path
+        self._new_capacity = capacity
+        self._pid = None
+        self._open()
+
+    def _open(self):
+        """ Opens and maps the table file in the current process """
+        if self._pid is not None:
+            # Inherited across a fork: drop the parent's description
+            self._map.close()
+            os.close(self._fd)
+        self._fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            magic = os.pread(self._fd, len(self.MAGIC), 0)
+            if magic != self.MAGIC:
+                if magic != b"":
+                    raise ValueError("{} is not a session table".format(
+                        self.file_path))
+                capacity = self._new_capacity
+                os.ftruncate(self._fd,
+                             self.HEADER.size + capacity * self.SLOT.size)
+                os.pwrite(self._fd,
+                          self.HEADER.pack(self.MAGIC, capacity, 0), 0)
+            self._map = mmap.mmap(self._fd, 0)
+            self.capacity = self.HEADER.unpack_from(self._map, 0)[1]
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _offset(self, slot: int) -> int:
+        """ Returns the file offset of a slot """
+        return self.HEADER.size + slot * self.SLOT.size
+
+    def _home(self, key: bytes) -> int:
+        """ Returns the slot a key hashes to """
+        return zlib.crc32(key) % self.capacity
+
+    def _key(self, slot: int) -> bytes:
+        """ Returns the session ID stored in a used slot """
+        offset = self._offset(slot)
+        return self._map[offset + 2:offset + 2 + self._map[offset + 1]]
+
+    def _used(self) -> int:
+        """ Returns the number of used slots """
+        return self.HEADER.unpack_from(self._map, 0)[2]
+
+    def _set_used(self, used: int):
+        """ Records the number of used slots """
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.capacity, used)
+
+    def _sync(self):
+        """ Remaps the file if another process resized the table """
+        capacity = self.HEADER.unpack_from(self._map, 0)[1]
+        if capacity != self.capacity:
+            self._map.close()
+            self._map = mmap.mmap(self._fd, 0)
+            self.capacity = capacity
+
+    def _find(self, key: bytes) -> Tuple[Optional[int], int]:
+        """
+        Probes the table for a key.
+        Returns:
+            Tuple: (slot holding the key or None, first empty slot probed)
+        """
+        slot = self._home(key)
+        while self._map[self._offset(slot)] != self.EMPTY:
+            if self._key(slot) == key:
+                return slot, slot
+            slot = (slot + 1) % self.capacity
+        return None, slot
+
+    def _resize(self, capacity: int):
+        """ Rehashes every entry into a table of the given capacity """
+        slots = [self._map[self._offset(slot):self._offset(slot + 1)]
+                 for slot in range(self.capacity)
+                 if self._map[self._offset(slot)] == self.USED]
+        self._map.close()
+        os.ftruncate(self._fd, self.HEADER.size)
+        os.ftruncate(self._fd, self.HEADER.size + capacity * self.SLOT.size)
+        self._map = mmap.mmap(self._fd, 0)
+        self.capacity = capacity
+        for entry in slots:
+            _, empty = self._find(entry[2:2 + entry[1]])
+            self._map[self._offset(empty):self._offset(empty + 1)] = entry
+        self._set_used(len(slots))
+
+    @contextmanager
+    def _locked(self, operation: int):
+        """ Holds the file lock (shared or exclusive) and the thread lock
+        """
+        if self._pid != os.getpid():
+            self._open()
+        with self._lock:
+            fcntl.flock(self._fd, operation)
+            try:
+                self._sync()
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def get(self, session_id: str) -> Optional[Tuple[str, float]]:
+        """ Retrieves a session """
+        key = session_id.encode()
+        if len(key) > self.KEY_SIZE:
+            return None
+        with self._locked(fcntl.LOCK_SH):
+            slot, _ = self._find(key)
+            if slot is None:
+                return None
+            _, _, _, length, user_id, created_at = self.SLOT.unpack_from(
+                self._map, self._offset(slot))
+        return user_id[:length].decode(), created_at
+
+    def set(self, session_id: str, user_id: str, created_at: float):
+        """ Stores a session """
+        key, value = session_id.encode(), user_id.encode()
+        if len(key) > self.KEY_SIZE or len(value) > self.KEY_SIZE:
+            raise ValueError("session and user IDs are limited to {} bytes"
+                             .format(self.KEY_SIZE))
+        with self._locked(fcntl.LOCK_EX):
+            slot, empty = self._find(key)
+            if slot is None:
+                used = self._used() + 1
+                if used > self.capacity * self.MAX_LOAD:
+                    self._resize(self.capacity * 2)
+                    _, empty = self._find(key)
+                self._set_used(used)
+            self.SLOT.pack_into(self._map, self._offset(empty), self.USED,
+                                len(key), key, len(value), value, created_at)
+
+    def _remove_slot(self, slot: int):
+        """
+        Empties a slot, shifting back the entries of the probe run after
+        it that can no longer be reached past the hole.
+        """
+        hole = slot
+        while True:
+            slot = (slot + 1) % self.capacity
+            if self._map[self._offset(slot)] == self.EMPTY:
+                break
+            home = self._home(self._key(slot))
+            # The entry stays if its home lies cyclically in (hole, slot]
+            if hole < slot:
+                stays = hole < home <= slot
+            else:
+                stays = home > hole or home <= slot
+            if not stays:
+                self._map[self._offset(hole):self._offset(hole + 1)] = \
+                    self._map[self._offset(slot):self._offset(slot + 1)]
+                hole = slot
+        self._map[self._offset(hole)] = self.EMPTY
+        self._set_used(self._used() - 1)
+
+    def delete(self, session_id: str) -> bool:
+        """ Removes a session """
+        key = session_id.encode()
+        if len(key) > self.KEY_SIZE:
+            return False
+        with self._locked(fcntl.LOCK_EX):
+            slot, _ = self._find(key)
+            if slot is None:
+                return False
+            self._remove_slot(slot)
+        return True
+
+    def purge_expired(self, cutoff: float) -> int:
+        """ Removes every session created before cutoff, scanning every
+        slot once
+        """
+        with self._locked(fcntl.LOCK_EX):
+            expired = []
+            for slot in range(self.capacity):
+                offset = self._offset(slot)
+                if self._map[offset] == self.USED and self.SLOT.unpack_from(
+                        self._map, offset)[5] < cutoff:
+                    expired.append(self._key(slot))
+            # Shifting entries back moves them, so look each one up again
+            for key in expired:
+                self._remove_slot(self._find(key)[0])
+        return len(expired)
+
+    def __len__(self) -> int:
+        """ Returns the number of stored sessions """
+        with self._locked(fcntl.LOCK_SH):
+            return self._used()
+
+
+def session_store_from_env(
+        sessions: Dict[str, Tuple[str, float]] = None) -> SessionStore:
+    """
+    Builds the session store selected by SESSION_STORE.
+    Args:
+        sessions (dict, optional): The dict of the "memory" store.
+    Returns:
+        SessionStore: The session store.
+    """
+    kind = os.getenv("SESSION_STORE", "memory")
+    if kind == "sqlite":
+        return SQLiteSessionStore(
+            os.getenv("SESSION_STORE_PATH", ".sessions.sqlite"))
+    if kind == "mmap":
+        return MmapSessionStore(
+            os.getenv("SESSION_STORE_PATH", ".sessions.mmap"),
+            int(os.getenv("SESSION_STORE_CAPACITY", 16384)))
+    if kind != "memory":
+        raise ValueError("unknown SESSION_STORE {}".format(kind))
+    return MemorySessionStore(sessions)
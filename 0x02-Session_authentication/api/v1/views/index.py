@@ -39,9 +39,13 @@ def status() -> str:
 def stats() -> str:
     """ GET /api/v1/stats
     Return:
-      - the number of each objects
+      - the number of each objects, and the session counters when the
+        auth expires sessions
     """
+    from api.v1.app import auth
     from models.user import User
     stats = {}
     stats['users'] = User.count()
+    if hasattr(auth, "session_metrics"):
+        stats['sessions'] = auth.session_metrics()
     return jsonify(stats)
@@ -4,22 +4,158 @@ This module defines routes for managing User resources,
 including retrieving, creating, updating, and deleting users.
 """
 
+import hashlib
+import json
+import os
+from typing import Callable, Iterator, List
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import abort, jsonify, request, Response
 from models.user import User
 
+PAGE_DEFAULT_LIMIT = 100
+PAGE_MAX_LIMIT = 1000
+STREAM_BATCH_SIZE = 500
+
+
+def _json_response(etag: str, build: Callable[[], str]) -> Response:
+    """ Returns the JSON text made by build with its ETag, or 304 Not
+    Modified without building it when If-None-Match holds that ETag
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(build() + "\n", mimetype="application/json")
+    response.set_etag(etag)
+    return response
+
+
+def _users_response(users: List[User], next_cursor: str = None,
+                    paginated: bool = False) -> Response:
+    """ Returns the users as a JSON list (or a page object) from their
+    cached serialized forms, with an ETag derived from theirs
+    """
+    parts = [user.serialized() for user in users]
+    digest = hashlib.blake2b(digest_size=16)
+    for _, etag in parts:
+        digest.update(etag.encode())
+    if paginated:
+        digest.update(json.dumps(next_cursor).encode())
+
+    def build() -> str:
+        body = "[" + ", ".join(body for body, _ in parts) + "]"
+        if not paginated:
+            return body
+        return '{{"next_cursor": {}, "users": {}}}'.format(
+            json.dumps(next_cursor), body)
+    return _json_response(digest.hexdigest(), build)
+
+
+def _stream_users(ndjson: bool) -> Iterator[str]:
+    """ Yields every user, in id order, as a JSON array or as NDJSON,
+    reading them one page at a time so memory stays bounded.
+    """
+    cursor = None
+    first = True
+    if not ndjson:
+        yield "["
+    while True:
+        users, cursor = User.page(STREAM_BATCH_SIZE, cursor)
+        for user in users:
+            if ndjson:
+                yield json.dumps(user.to_json()) + "\n"
+            else:
+                yield ("" if first else ",") + json.dumps(user.to_json())
+            first = False
+        if cursor is None:
+            break
+    if not ndjson:
+        yield "]\n"
+
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
     Retrieves a list of all users in JSON format.
 
+    Query parameters (optional):
+      - limit: page size, from 1 to PAGE_MAX_LIMIT
+      - cursor: the next_cursor returned with the previous page
+      - stream: "json" or "ndjson" to stream every user incrementally
     Return:
       - JSON list of all User objects
+      - with limit/cursor: {"users": [...], "next_cursor": ...}, users
+        ordered by id and next_cursor null on the last page
+      - 304 if If-None-Match holds the ETag of the list or page
+      - 400 error if limit or stream is invalid
+    """
+    stream = request.args.get("stream")
+    if stream is not None:
+        if stream not in ("json", "ndjson"):
+            return jsonify({'error': "stream must be json or ndjson"}), 400
+        mimetype = ("application/x-ndjson" if stream == "ndjson"
+                    else "application/json")
+        return Response(_stream_users(stream == "ndjson"), mimetype=mimetype)
+
+    limit = request.args.get("limit")
+    cursor = request.args.get("cursor")
+    if limit is None and cursor is None:
+        # Retrieve all User objects in their cached JSON format
+        return _users_response(User.all())
+
+    try:
+        limit = int(limit) if limit is not None else PAGE_DEFAULT_LIMIT
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > PAGE_MAX_LIMIT:
+        return jsonify({'error': "limit must be between 1 and {}".format(
+            PAGE_MAX_LIMIT)}), 400
+
+    users, next_cursor = User.page(limit, cursor)
+    return _users_response(users, next_cursor, paginated=True)
+
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_FIELDS = ("email", "first_name", "last_name")
+
+
+@app_views.route('/users/search', methods=['GET'], strict_slashes=False)
+def search_users() -> str:
+    """ GET /api/v1/users/search
+    Retrieves the users matching every given filter.
+
+    Query parameters (at least one filter):
+      - email: exact email
+      - <field>_prefix: case-insensitive prefix of email, first_name
+        or last_name
+      - <field>_contains: case-insensitive substring of email,
+        first_name or last_name
+      - limit: maximum number of users, from 1 to PAGE_MAX_LIMIT
+    Return:
+      - {"users": [...], "count": ..., "strategy": "index" or "scan"}
+      - 400 error if no filter is given or limit is invalid
     """
-    # Retrieve all User objects and convert to JSON format
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    exact, prefix, contains = {}, {}, {}
+    if request.args.get("email") is not None:
+        exact["email"] = request.args.get("email")
+    for field in SEARCH_FIELDS:
+        if request.args.get(field + "_prefix"):
+            prefix[field] = request.args.get(field + "_prefix")
+        if request.args.get(field + "_contains"):
+            contains[field] = request.args.get(field + "_contains")
+    if not exact and not prefix and not contains:
+        return jsonify({'error': "no search filter"}), 400
+
+    try:
+        limit = int(request.args.get("limit", SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > PAGE_MAX_LIMIT:
+        return jsonify({'error': "limit must be between 1 and {}".format(
+            PAGE_MAX_LIMIT)}), 400
+
+    users, strategy = User.find(exact, prefix, contains, limit)
+    return jsonify({"users": [user.to_json() for user in users],
+                    "count": len(users), "strategy": strategy})
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -31,6 +167,7 @@ def view_one_user(user_id: str = None) -> str:
       - user_id: The ID of the User to retrieve
     Return:
       - JSON representation of the User object if found
+      - 304 if If-None-Match holds the ETag of the User
       - 404 error if the User ID doesn't exist
     """
     if user_id is None:
@@ -41,12 +178,13 @@ def view_one_user(user_id: str = None) -> str:
         if request.current_user is None:
             abort(404)
         user = request.current_user
-        return jsonify(user.to_json())
-    # Fetch the user by ID
-    user = User.get(user_id)
+    else:
+        # Fetch the user by ID
+        user = User.get(user_id)
     if user is None:
         abort(404)  # Abort with 404 if user not found
-    return jsonify(user.to_json())
+    body, etag = user.serialized()
+    return _json_response(etag, lambda: body)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -157,3 +295,117 @@ def update_user(user_id: str = None) -> str:
     # Save updated user
     user.save()
     return jsonify(user.to_json()), 200  # Return updated user in JSON format
+
+
+def _check_operation(op: dict, removed: set) -> str:
+    """ Validates one bulk operation the way create_user/update_user do.
+
+    Return:
+      - the error message, or None if the operation is valid
+    """
+    if not isinstance(op, dict):
+        return "Wrong format"
+    action = op.get("op")
+    if action == "create":
+        if op.get("email", "") == "":
+            return "email missing"
+        if op.get("password", "") == "":
+            return "password missing"
+        return None
+    if action in ("update", "delete"):
+        user_id = op.get("id")
+        if not isinstance(user_id, str) or user_id in removed \
+                or User.get(user_id) is None:
+            return "Not found"
+        if action == "delete":
+            removed.add(user_id)
+        return None
+    return "op must be create, update or delete"
+
+
+def _apply_operation(op: dict) -> dict:
+    """ Applies one validated bulk operation without persisting it.
+
+    Return:
+      - the per-item result: status, and the user JSON or an error
+    """
+    action = op.get("op")
+    if action == "create":
+        user = User()
+        user.email = op.get("email")
+        user.password = op.get("password")
+        user.first_name = op.get("first_name")
+        user.last_name = op.get("last_name")
+        user.save()
+        return {"status": 201, "user": user.to_json()}
+
+    user = User.get(op.get("id"))
+    if action == "delete":
+        user.remove()
+        return {"status": 200}
+    if op.get('first_name') is not None:
+        user.first_name = op.get('first_name')
+    if op.get('last_name') is not None:
+        user.last_name = op.get('last_name')
+    user.save()
+    return {"status": 200, "user": user.to_json()}
+
+
+@app_views.route('/users/bulk', methods=['POST'], strict_slashes=False)
+def bulk_users() -> str:
+    """ POST /api/v1/users/bulk
+    Applies many create/update/delete operations and persists them once.
+
+    JSON body, either a list of operations or an object with:
+      - operations: list of operations, each one of
+        {"op": "create", "email", "password", "first_name", "last_name"}
+        {"op": "update", "id", "first_name", "last_name"}
+        {"op": "delete", "id"}
+      - atomic: if true, nothing is applied unless every operation
+        is valid (optional, defaults to false)
+    Return:
+      - JSON {"results": [...]} with one result per operation, in order,
+        holding its status and the user JSON or an error
+      - 400 error if the body is malformed, holds more than
+        USERS_BULK_MAX_SIZE operations, or is atomic with invalid ones
+    """
+    rj = None
+    try:
+        rj = request.get_json()
+    except Exception as e:
+        rj = None
+    atomic = False
+    if isinstance(rj, dict):
+        atomic = rj.get("atomic") is True
+        rj = rj.get("operations")
+    if not isinstance(rj, list):
+        return jsonify({'error': "Wrong format"}), 400
+    try:
+        max_size = int(os.getenv("USERS_BULK_MAX_SIZE", 1000))
+    except ValueError:
+        max_size = 1000
+    if len(rj) > max_size:
+        return jsonify({'error': "at most {} operations".format(
+            max_size)}), 400
+
+    removed = set()
+    errors = [_check_operation(op, removed) for op in rj]
+    if atomic and any(errors):
+        results = [{"status": 400, "error": e} if e else {"status": 424}
+                   for e in errors]
+        return jsonify({'error': "invalid operations, nothing applied",
+                        'results': results}), 400
+
+    results = []
+    with User.bulk():
+        for op, error in zip(rj, errors):
+            if error is not None:
+                results.append({"status": 400, "error": error})
+                continue
+            try:
+                results.append(_apply_operation(op))
+            except Exception as e:
+                results.append({"status": 400,
+                                "error": "Can't apply operation: {}".format(
+                                    e)})
+    return jsonify({"results": results}), 200
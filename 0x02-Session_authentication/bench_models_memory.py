@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+""" Measure the memory held per User in DATA, with the __slots__ layout
+of User against the per-instance __dict__ layout it replaced
+
+Usage: python3 bench_models_memory.py [number_of_users]
+"""
+import sys
+import tracemalloc
+
+from models.base import DATA
+from models.user import User
+
+
+class DictUser():
+    """ Plain object holding the User fields in its __dict__, the
+    layout of User before it declared __slots__
+    """
+
+
+def make_user(i: int) -> User:
+    """ Return the i-th User of the benchmark
+    """
+    user = User(email="user{}@example.com".format(i),
+                first_name="First{}".format(i),
+                last_name="Last{}".format(i))
+    user.password = "password{}".format(i)
+    return user
+
+
+def as_dict_user(user: User) -> DictUser:
+    """ Return a DictUser sharing the field values of user
+    """
+    obj = DictUser()
+    obj.__dict__.update((name, getattr(user, name))
+                        for name in User._fields)
+    return obj
+
+
+def bytes_per_user(count: int, layout=None) -> float:
+    """ Return the traced bytes per User kept in DATA, each converted
+    by layout first when it is given
+    """
+    DATA["User"] = {}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        user = make_user(i)
+        DATA["User"][user.id] = layout(user) if layout else user
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    DATA["User"] = {}
+    return (after - before) / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    slots = bytes_per_user(count)
+    dicts = bytes_per_user(count, as_dict_user)
+    print("{} users: {:.0f} bytes per user with __dict__, "
+          "{:.0f} with __slots__ ({:.0f} saved)".format(
+              count, dicts, slots, dicts - slots))
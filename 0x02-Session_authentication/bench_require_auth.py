@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+""" Measure the cost of Auth.require_auth as excluded routes grow
+
+Usage: python3 bench_require_auth.py [number_of_calls]
+"""
+import sys
+import timeit
+from typing import List
+
+from api.v1.auth.auth import Auth, PathMatcher
+
+ROUTE_COUNTS = (4, 16, 64, 256, 1024, 4096)
+PATHS = {"exact": "/api/v1/route0",
+         "wildcard": "/api/v1/static/css/site.css",
+         "miss": "/api/v1/users/me"}
+
+
+def loop_require_auth(path: str, excluded_paths: List[str]) -> bool:
+    """ The original list test and startswith loop of require_auth
+    """
+    if path in excluded_paths:
+        return False
+    for excluded_path in excluded_paths:
+        if excluded_path.startswith(path):
+            return False
+        elif path.startswith(excluded_path):
+            return False
+        elif excluded_path[-1] == "*":
+            if path.startswith(excluded_path[:-1]):
+                return False
+    return True
+
+
+def routes(count: int) -> List[str]:
+    """ Return count exclusion rules, one of them a wildcard
+    """
+    rules = ["/api/v1/route{}/".format(i) for i in range(count - 1)]
+    return rules + ["/api/v1/static/*"]
+
+
+def ns_per_call(func, number: int) -> float:
+    """ Return the best nanoseconds per call of func
+    """
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e9
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    auth = Auth()
+    print("{:>6} {:>9} {:>10} {:>10} {:>10}".format(
+        "routes", "path", "loop ns", "list ns", "matcher ns"))
+    for count in ROUTE_COUNTS:
+        rules = routes(count)
+        matcher = PathMatcher(rules)
+        for name, path in PATHS.items():
+            print("{:>6} {:>9} {:>10.0f} {:>10.0f} {:>10.0f}".format(
+                count, name,
+                ns_per_call(lambda: loop_require_auth(path, rules), number),
+                ns_per_call(lambda: auth.require_auth(path, rules), number),
+                ns_per_call(lambda: auth.require_auth(path, matcher),
+                            number)))
@@ -1,21 +1,215 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator, Optional, Tuple
+from os import getenv, path
+import atexit
+import hashlib
 import json
+import os
+import re
+import threading
+import time
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+# class name -> attribute -> (value -> {id: None}, id -> value)
+INDEXES = {}
+# class name -> sorted list of ids, the stable order of paginated reads
+ORDERED_IDS = {}
+# class name -> attribute -> (sorted [(casefolded value, id)],
+#                             id -> casefolded value)
+PREFIX_INDEXES = {}
+# class name -> attribute -> (trigram -> {ids}, id -> casefolded value)
+NGRAM_INDEXES = {}
+NGRAM_SIZE = 3
+# class name -> id -> (updated_at, JSON text of to_json(), ETag), each
+# class keeping its SERIALIZED_CACHE_SIZE most recently used entries
+SERIALIZED = {}
+SERIALIZED_CACHE_SIZE = int(getenv("MODEL_SERIALIZED_CACHE_SIZE", 1024))
+_SERIALIZED_LOCK = threading.Lock()
+# Guards DATA/INDEXES mutations and the snapshots taken of them
+DATA_LOCK = threading.RLock()
+# Serializes writes to the .db_<Class> files
+FILE_LOCK = threading.RLock()
+# Write-behind state: class name -> (class, first dirty time) and
+# class name -> {id: object or None} changes waiting to be written
+_DIRTY = {}
+_PENDING = {}
+_flush_event = threading.Event()
+_flusher = None
+# Per-thread changes deferred by Base.bulk(): class name -> {id: object}
+_BULK = threading.local()
+_WHITESPACE = re.compile(r'\s*')
+_MISSING = object()
+
+
+def _fold(value) -> Optional[str]:
+    """ Return the case-insensitive form of a string value, else None
+    """
+    return value.casefold() if isinstance(value, str) else None
+
+
+def _ngrams(text: str) -> set:
+    """ Return the NGRAM_SIZE-long substrings of text
+    """
+    return {text[i:i + NGRAM_SIZE]
+            for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+class LazyRecords(dict):
+    """ Objects of one class keyed by id, where records loaded from file
+    are kept as their raw JSON text and only turned into instances the
+    first time they are read
+    """
+
+    def __init__(self, cls: type):
+        """ Initialize an empty store for cls
+        """
+        super().__init__()
+        self.cls = cls
+
+    def _hydrate(self, key: str, value):
+        """ Return the instance for a value, building it if still raw
+        """
+        if not isinstance(value, str):
+            return value
+        with DATA_LOCK:
+            value = dict.get(self, key, value)
+            if isinstance(value, str):
+                value = self.cls(**json.loads(value))
+                dict.__setitem__(self, key, value)
+        return value
+
+    def __getitem__(self, key: str):
+        """ Return the instance stored under key
+        """
+        return self._hydrate(key, dict.__getitem__(self, key))
+
+    def get(self, key: str, default=None):
+        """ Return the instance stored under key, else default
+        """
+        if not dict.__contains__(self, key):
+            return default
+        return self[key]
+
+    def values(self) -> list:
+        """ Return every instance, building the raw ones
+        """
+        return [self._hydrate(k, v) for k, v in list(dict.items(self))]
+
+    def items(self) -> list:
+        """ Return (id, instance) pairs, building the raw instances
+        """
+        return [(k, self._hydrate(k, v)) for k, v in list(dict.items(self))]
+
+
+def _iter_raw_records(file_path: str,
+                      chunk_size: int = 1 << 16) -> Iterator[Tuple[str, str]]:
+    """ Yield (id, raw JSON text) for each record of a .db_<Class>.json
+    file, reading it in chunks so the whole file is never in memory
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r') as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def skip(pos: int) -> int:
+            """ Return the position of the next non-blank character """
+            return _WHITESPACE.match(buf, pos).end()
+
+        def decode(pos: int):
+            """ Decode the value at pos, reading more data as needed """
+            nonlocal buf, eof
+            while True:
+                try:
+                    return decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                chunk = f.read(chunk_size)
+                eof = chunk == ""
+                buf += chunk
+
+        def peek(pos: int) -> Tuple[str, int]:
+            """ Return the next non-blank character and its position """
+            nonlocal buf, eof
+            pos = skip(pos)
+            while pos >= len(buf) and not eof:
+                chunk = f.read(chunk_size)
+                eof = chunk == ""
+                buf += chunk
+                pos = skip(pos)
+            return buf[pos:pos + 1], pos
+
+        char, pos = peek(pos)
+        if char != "{":
+            raise ValueError("{} is not a JSON object".format(file_path))
+        char, pos = peek(pos + 1)
+        while char != "}":
+            if char == "":
+                raise ValueError("{} is truncated".format(file_path))
+            obj_id, pos = decode(pos)
+            char, pos = peek(pos)
+            _, start = peek(pos + 1)
+            _, end = decode(start)
+            yield obj_id, buf[start:end]
+            char, pos = peek(end)
+            if char == ",":
+                char, pos = peek(pos + 1)
+            # Drop what was consumed so the buffer stays one record long
+            buf = buf[pos:]
+            pos = 0
 
 
 class Base():
     """ Base class
+    Subclasses declare their fields in __slots__ so instances carry no
+    per-object __dict__; _fields lists every declared field in MRO order.
     """
 
+    __slots__ = ("id", "created_at", "updated_at")
+    _fields: Tuple[str, ...] = __slots__
+
+    # Attributes with a hash index kept up to date by save/remove/load
+    INDEXED_ATTRIBUTES: Tuple[str, ...] = ()
+    # String attributes with case-insensitive prefix and substring
+    # indexes, used by find()
+    TEXT_INDEXED_ATTRIBUTES: Tuple[str, ...] = ()
+    # "snapshot" rewrites .db_<Class>.json on every change, "journal"
+    # appends the change to .db_<Class>.journal and compacts it into
+    # the snapshot once it grows past JOURNAL_MAX_BYTES
+    STORAGE_MODE = getenv("MODEL_STORAGE_MODE", "snapshot")
+    JOURNAL_MAX_BYTES = int(getenv("MODEL_JOURNAL_MAX_BYTES", 1 << 20))
+    # "immediate" writes every change before save/remove return,
+    # "grouped" marks the class dirty and a background thread writes it
+    # at most once per FLUSH_INTERVAL seconds or FLUSH_BATCH_SIZE changes
+    DURABILITY = getenv("MODEL_DURABILITY", "immediate")
+    # "eager" builds every instance at load, "lazy" streams the file
+    # into raw records built into instances on first get/search/all
+    LOAD_MODE = getenv("MODEL_LOAD_MODE", "eager")
+    FLUSH_INTERVAL = float(getenv("MODEL_FLUSH_INTERVAL", 1.0))
+    FLUSH_BATCH_SIZE = int(getenv("MODEL_FLUSH_BATCH_SIZE", 100))
+
+    def __init_subclass__(cls, **kwargs):
+        """ Collect the fields declared through __slots__ by the class
+        """
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get("__slots__", ()):
+                if name not in ("__dict__", "__weakref__") \
+                        and name not in fields:
+                    fields.append(name)
+        cls._fields = tuple(fields)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
@@ -48,7 +242,12 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        values = [(key, getattr(self, key, _MISSING)) for key in self._fields]
+        # Subclasses without __slots__ keep extra attributes in __dict__
+        values.extend(getattr(self, "__dict__", {}).items())
+        for key, value in values:
+            if value is _MISSING:
+                continue
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,49 +256,484 @@ class Base():
                 result[key] = value
         return result
 
+    def serialized(self) -> Tuple[str, str]:
+        """ Return the JSON text of to_json() and its strong ETag, cached
+        until save() changes updated_at or the entry is evicted
+        """
+        with _SERIALIZED_LOCK:
+            cache = SERIALIZED.setdefault(self.__class__.__name__,
+                                          OrderedDict())
+            entry = cache.get(self.id)
+            if entry is not None and entry[0] == self.updated_at:
+                cache.move_to_end(self.id)
+                return entry[1], entry[2]
+        body = json.dumps(self.to_json(), sort_keys=True)
+        etag = hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+        if SERIALIZED_CACHE_SIZE > 0:
+            with _SERIALIZED_LOCK:
+                cache[self.id] = (self.updated_at, body, etag)
+                cache.move_to_end(self.id)
+                while len(cache) > SERIALIZED_CACHE_SIZE:
+                    cache.popitem(last=False)
+        return body, etag
+
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file, then replay the journal
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        cls.flush()
+        # FILE_LOCK first: replaying may repair the journal
+        with FILE_LOCK, DATA_LOCK:
+            lazy = cls.LOAD_MODE == "lazy"
+            DATA[s_class] = LazyRecords(cls) if lazy else {}
+            # Indexes are rebuilt from DATA on first use
+            INDEXES[s_class] = {}
+            ORDERED_IDS.pop(s_class, None)
+            PREFIX_INDEXES.pop(s_class, None)
+            NGRAM_INDEXES.pop(s_class, None)
+            SERIALIZED.pop(s_class, None)
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+            if path.exists(file_path):
+                if lazy:
+                    for obj_id, raw in _iter_raw_records(file_path):
+                        dict.__setitem__(DATA[s_class], obj_id, raw)
+                else:
+                    with open(file_path, 'r') as f:
+                        objs_json = json.load(f)
+                        for obj_id, obj_json in objs_json.items():
+                            DATA[s_class][obj_id] = cls(**obj_json)
+            cls._replay_journal()
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
+        The objects are serialized under DATA_LOCK, so concurrent saves
+        can't change DATA mid-iteration, and the snapshot is written to a
+        temporary file then renamed over the old one, so readers never
+        see a partial file.
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with FILE_LOCK:
+            entries = []
+            with DATA_LOCK:
+                # Records never hydrated are written back as they were read
+                for obj_id, obj in dict.items(DATA[s_class]):
+                    if not isinstance(obj, str):
+                        obj = json.dumps(obj.to_json(True))
+                    entries.append("{}: {}".format(json.dumps(obj_id), obj))
+
+            tmp_path = "{}.tmp".format(file_path)
+            with open(tmp_path, 'w') as f:
+                f.write("{" + ", ".join(entries) + "}")
+            os.replace(tmp_path, file_path)
+
+    @classmethod
+    def _journal_path(cls) -> str:
+        """ Path of the append-only journal of the class
+        """
+        return ".db_{}.journal".format(cls.__name__)
+
+    @classmethod
+    def _replay_journal(cls):
+        """ Apply the journal records on top of the loaded snapshot
+        A torn last write is cut off the journal, so later appends start
+        on a fresh line instead of extending the partial one
+        """
+        s_class = cls.__name__
+        journal_path = cls._journal_path()
+        if not path.exists(journal_path):
+            return
+
+        with open(journal_path, 'rb+') as f:
+            end = 0  # offset after the last complete record
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    f.truncate(end)  # torn last write
+                    break
+                end += len(line)
+                if not line.endswith(b"\n"):
+                    f.write(b"\n")  # complete record, newline lost
+                if record.get("obj") is None:
+                    DATA[s_class].pop(record["id"], None)
+                elif isinstance(DATA[s_class], LazyRecords):
+                    dict.__setitem__(DATA[s_class], record["id"],
+                                     json.dumps(record["obj"]))
+                else:
+                    DATA[s_class][record["id"]] = cls(**record["obj"])
+
+    @classmethod
+    def compact(cls):
+        """ Fold the journal into a fresh snapshot and empty it
+        """
+        with FILE_LOCK:
+            cls.save_to_file()
+            # Replaying the journal over the new snapshot is harmless, so
+            # a crash between the two steps loses nothing
+            if path.exists(cls._journal_path()):
+                os.remove(cls._journal_path())
+
+    @classmethod
+    def _write_changes(cls, changes: dict):
+        """ Write changes ({id: object or None}) with the storage mode
+        """
+        if cls.STORAGE_MODE != "journal":
+            # compact() also drops a journal left by the journal mode,
+            # which would otherwise be replayed over this newer snapshot
+            cls.compact()
+            return
+
+        s_class = cls.__name__
+        # Lines are built and appended under one FILE_LOCK hold, from the
+        # state in DATA at that time, so concurrent writers of the same
+        # object always leave its latest state last
+        with FILE_LOCK:
+            with DATA_LOCK:
+                lines = []
+                for obj_id in changes:
+                    obj = dict.get(DATA.get(s_class, {}), obj_id)
+                    if isinstance(obj, str):
+                        obj = json.loads(obj)
+                    elif obj is not None:
+                        obj = obj.to_json(True)
+                    lines.append(json.dumps({"id": obj_id, "obj": obj})
+                                 + "\n")
+            with open(cls._journal_path(), 'a') as f:
+                f.write("".join(lines))
+                size = f.tell()
+            if size > cls.JOURNAL_MAX_BYTES:
+                cls.compact()
+
+    @classmethod
+    def _persist(cls, obj_id: str, obj: TypeVar('Base') = None):
+        """ Persist the change of one object (None for a removal)
+        """
+        s_class = cls.__name__
+        deferred = getattr(_BULK, "changes", {}).get(s_class)
+        if deferred is not None:
+            deferred.pop(obj_id, None)
+            deferred[obj_id] = obj
+            return
+
+        if cls.DURABILITY != "grouped":
+            cls._write_changes({obj_id: obj})
+            return
+
+        with DATA_LOCK:
+            # Only the latest state of each object needs writing
+            pending = _PENDING.setdefault(s_class, {})
+            pending.pop(obj_id, None)
+            pending[obj_id] = obj
+            if s_class not in _DIRTY:
+                _DIRTY[s_class] = (cls, time.monotonic())
+            full = len(pending) >= cls.FLUSH_BATCH_SIZE
+        _start_flusher()
+        if full:
+            _flush_event.set()
+
+    @classmethod
+    @contextmanager
+    def bulk(cls):
+        """ Defer the persistence of the saves and removes of the class
+        made by this thread inside the with block, and write them all
+        at once when it exits
+        """
+        s_class = cls.__name__
+        if not hasattr(_BULK, "changes"):
+            _BULK.changes = {}
+        if s_class in _BULK.changes:
+            yield  # nested: the outer block writes the changes
+            return
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        _BULK.changes[s_class] = {}
+        try:
+            yield
+        finally:
+            changes = _BULK.changes.pop(s_class)
+            if cls.DURABILITY == "grouped":
+                for obj_id, obj in changes.items():
+                    cls._persist(obj_id, obj)
+            elif changes:
+                cls._write_changes(changes)
+
+    @classmethod
+    def flush(cls):
+        """ Write the pending changes of the class now
+        """
+        s_class = cls.__name__
+        with FILE_LOCK:
+            with DATA_LOCK:
+                _DIRTY.pop(s_class, None)
+                changes = _PENDING.pop(s_class, None)
+            if not changes:
+                return
+            try:
+                cls._write_changes(changes)
+            except Exception:
+                # Put the changes back, under any newer ones, and retry later
+                with DATA_LOCK:
+                    changes.update(_PENDING.get(s_class, {}))
+                    _PENDING[s_class] = changes
+                    _DIRTY.setdefault(s_class, (cls, time.monotonic()))
+                raise
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        SERIALIZED.get(s_class, {}).pop(self.id, None)
+        with DATA_LOCK:
+            DATA[s_class][self.id] = self
+            self.__class__._index(self)
+            ids = self.__class__._ordered_ids()
+            i = bisect_left(ids, self.id)
+            if i == len(ids) or ids[i] != self.id:
+                ids.insert(i, self.id)
+        self.__class__._persist(self.id, self)
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
+        with DATA_LOCK:
+            if DATA[s_class].get(self.id) is None:
+                return
             del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            SERIALIZED.get(s_class, {}).pop(self.id, None)
+            self.__class__._unindex(self.id)
+            ids = self.__class__._ordered_ids()
+            i = bisect_left(ids, self.id)
+            if i < len(ids) and ids[i] == self.id:
+                del ids[i]
+        self.__class__._persist(self.id)
+
+    @classmethod
+    def _ordered_ids(cls) -> List[str]:
+        """ Return the sorted ids of the class, building them if needed
+        """
+        s_class = cls.__name__
+        ids = ORDERED_IDS.get(s_class)
+        if ids is None:
+            with DATA_LOCK:
+                ids = sorted(DATA.get(s_class, {}).keys())
+                ORDERED_IDS[s_class] = ids
+        return ids
+
+    @classmethod
+    def page(cls, limit: int, cursor: str = None) \
+            -> Tuple[List[TypeVar('Base')], Optional[str]]:
+        """ Return up to limit objects ordered by id, starting after the
+        cursor, with the cursor of the next page (None on the last one)
+        """
+        s_class = cls.__name__
+        with DATA_LOCK:
+            ids = cls._ordered_ids()
+            start = bisect_right(ids, cursor) if cursor else 0
+            page_ids = ids[start:start + limit]
+            more = start + limit < len(ids)
+            objs = [DATA[s_class][i] for i in page_ids]
+        next_cursor = page_ids[-1] if more and page_ids else None
+        return objs, next_cursor
+
+    @classmethod
+    def _stored_values(cls, attr: str) -> Iterator[Tuple[str, object]]:
+        """ Yield (id, value of attr) for every object of the class;
+        raw records are read without building their instance
+        """
+        for obj_id, obj in dict.items(DATA.get(cls.__name__, {})):
+            if isinstance(obj, str):
+                yield obj_id, json.loads(obj).get(attr)
+            else:
+                yield obj_id, getattr(obj, attr, None)
+
+    @classmethod
+    def _indexes(cls) -> dict:
+        """ Return the indexes of the class, building missing ones
+        """
+        s_class = cls.__name__
+        indexes = INDEXES.setdefault(s_class, {})
+        for attr in cls.INDEXED_ATTRIBUTES:
+            if attr in indexes:
+                continue
+            with DATA_LOCK:
+                by_value, by_id = {}, {}
+                for obj_id, value in cls._stored_values(attr):
+                    try:
+                        by_value.setdefault(value, {})[obj_id] = None
+                    except TypeError:
+                        continue  # unhashable values are only found by a scan
+                    by_id[obj_id] = value
+                indexes[attr] = (by_value, by_id)
+        return indexes
+
+    @classmethod
+    def _prefix_index(cls, attr: str) -> tuple:
+        """ Return the prefix index of an attribute, building it if needed
+        """
+        indexes = PREFIX_INDEXES.setdefault(cls.__name__, {})
+        if attr not in indexes:
+            with DATA_LOCK:
+                by_id = {}
+                for obj_id, value in cls._stored_values(attr):
+                    if _fold(value) is not None:
+                        by_id[obj_id] = _fold(value)
+                keys = sorted((key, obj_id) for obj_id, key in by_id.items())
+                indexes[attr] = (keys, by_id)
+        return indexes[attr]
+
+    @classmethod
+    def _ngram_index(cls, attr: str) -> tuple:
+        """ Return the trigram index of an attribute, building it if needed
+        """
+        indexes = NGRAM_INDEXES.setdefault(cls.__name__, {})
+        if attr not in indexes:
+            with DATA_LOCK:
+                grams, by_id = {}, {}
+                for obj_id, value in cls._stored_values(attr):
+                    key = _fold(value)
+                    if key is None:
+                        continue
+                    by_id[obj_id] = key
+                    for gram in _ngrams(key):
+                        grams.setdefault(gram, set()).add(obj_id)
+                indexes[attr] = (grams, by_id)
+        return indexes[attr]
+
+    @classmethod
+    def _index(cls, obj: TypeVar('Base')):
+        """ Add (or move) an object in every index of the class
+        """
+        cls._unindex(obj.id)
+        for attr, (by_value, by_id) in cls._indexes().items():
+            value = getattr(obj, attr, None)
+            try:
+                by_value.setdefault(value, {})[obj.id] = None
+            except TypeError:
+                continue  # unhashable values are only found by a scan
+            by_id[obj.id] = value
+        # Text indexes not built yet will pick the object up from DATA
+        s_class = cls.__name__
+        for attr, (keys, by_id) in PREFIX_INDEXES.get(s_class, {}).items():
+            key = _fold(getattr(obj, attr, None))
+            if key is not None:
+                insort(keys, (key, obj.id))
+                by_id[obj.id] = key
+        for attr, (grams, by_id) in NGRAM_INDEXES.get(s_class, {}).items():
+            key = _fold(getattr(obj, attr, None))
+            if key is not None:
+                for gram in _ngrams(key):
+                    grams.setdefault(gram, set()).add(obj.id)
+                by_id[obj.id] = key
+
+    @classmethod
+    def _unindex(cls, obj_id: str):
+        """ Drop an object from every index of the class
+        """
+        for by_value, by_id in cls._indexes().values():
+            if obj_id not in by_id:
+                continue
+            value = by_id.pop(obj_id)
+            ids = by_value[value]
+            del ids[obj_id]
+            if not ids:
+                del by_value[value]
+        s_class = cls.__name__
+        for keys, by_id in PREFIX_INDEXES.get(s_class, {}).values():
+            if obj_id in by_id:
+                del keys[bisect_left(keys, (by_id.pop(obj_id), obj_id))]
+        for grams, by_id in NGRAM_INDEXES.get(s_class, {}).values():
+            if obj_id not in by_id:
+                continue
+            for gram in _ngrams(by_id.pop(obj_id)):
+                grams[gram].discard(obj_id)
+                if not grams[gram]:
+                    del grams[gram]
+
+    @classmethod
+    def find(cls, exact: dict = None, prefix: dict = None,
+             contains: dict = None,
+             limit: int = None) -> Tuple[List[TypeVar('Base')], str]:
+        """ Return the objects matching every filter, and "index" or
+        "scan" depending on how the candidates were found.
+        exact values are compared as in search(); prefix and contains
+        values match string attributes case-insensitively. Candidates
+        come from the hash index of an exact filter, else the prefix
+        index, else the trigram index (terms of NGRAM_SIZE characters or
+        more) of a TEXT_INDEXED_ATTRIBUTES filter, else from a scan.
+        """
+        s_class = cls.__name__
+        exact = exact or {}
+        prefix = {k: _fold(v) for k, v in (prefix or {}).items()}
+        contains = {k: _fold(v) for k, v in (contains or {}).items()}
+
+        def _match(obj):
+            for k, v in exact.items():
+                if getattr(obj, k, None) != v:
+                    return False
+            for k, v in prefix.items():
+                value = _fold(getattr(obj, k, None))
+                if value is None or not value.startswith(v):
+                    return False
+            for k, v in contains.items():
+                value = _fold(getattr(obj, k, None))
+                if value is None or v not in value:
+                    return False
+            return True
+
+        with DATA_LOCK:
+            candidates = cls._find_candidates(exact, prefix, contains)
+            strategy = "scan" if candidates is None else "index"
+            if candidates is None:
+                candidates = list(dict.keys(DATA[s_class]))
+            results = []
+            for obj_id in candidates:
+                obj = DATA[s_class][obj_id]
+                if _match(obj):
+                    results.append(obj)
+                    if limit is not None and len(results) >= limit:
+                        break
+        return results, strategy
+
+    @classmethod
+    def _find_candidates(cls, exact: dict, prefix: dict,
+                         contains: dict) -> Optional[Iterable[str]]:
+        """ Return the ids an index narrows a find() down to, or None
+        """
+        indexes = cls._indexes()
+        for k, v in exact.items():
+            if k in indexes:
+                try:
+                    return list(indexes[k][0].get(v, {}))
+                except TypeError:
+                    continue
+        for k, v in prefix.items():
+            if k in cls.TEXT_INDEXED_ATTRIBUTES and v is not None:
+                keys = cls._prefix_index(k)[0]
+                return cls._prefix_ids(keys, v)
+        for k, v in contains.items():
+            if k in cls.TEXT_INDEXED_ATTRIBUTES and v is not None \
+                    and len(v) >= NGRAM_SIZE:
+                grams = cls._ngram_index(k)[0]
+                sets = sorted((grams.get(g, set()) for g in _ngrams(v)),
+                              key=len)
+                return sorted(set.intersection(*sets))
+        return None
+
+    @staticmethod
+    def _prefix_ids(keys: List[Tuple[str, str]],
+                    prefix: str) -> Iterator[str]:
+        """ Yield, in value order, the ids whose value starts with prefix
+        """
+        for i in range(bisect_left(keys, (prefix,)), len(keys)):
+            key, obj_id = keys[i]
+            if not key.startswith(prefix):
+                break
+            yield obj_id
 
     @classmethod
     def count(cls) -> int:
@@ -121,6 +755,14 @@ class Base():
         s_class = cls.__name__
         return DATA[s_class].get(id)
 
+    @classmethod
+    def find_by(cls, **attributes) -> Optional[TypeVar('Base')]:
+        """ Return one object with matching attributes, or None; an
+        indexed attribute makes it a keyed lookup
+        """
+        objs, _ = cls.find(exact=attributes, limit=1)
+        return objs[0] if objs else None
+
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
@@ -133,5 +775,72 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        candidates = None
+        indexes = cls._indexes()
+        for k, v in attributes.items():
+            if k in indexes:
+                try:
+                    ids = list(indexes[k][0].get(v, {}))
+                except TypeError:
+                    continue
+                candidates = [DATA[s_class][i] for i in ids]
+                break
+        if candidates is None:
+            candidates = DATA[s_class].values()
+
+        return list(filter(_search, candidates))
+
+
+def flush_all():
+    """ Write the pending changes of every dirty class
+    """
+    with DATA_LOCK:
+        classes = [cls for cls, _ in _DIRTY.values()]
+    for cls in classes:
+        cls.flush()
+
+
+def _flush_loop():
+    """ Background flusher of the classes in "grouped" durability
+    """
+    while True:
+        now = time.monotonic()
+        due = []
+        timeout = None
+        with DATA_LOCK:
+            for s_class, (cls, since) in _DIRTY.items():
+                deadline = since + cls.FLUSH_INTERVAL
+                full = len(_PENDING.get(s_class, ())) >= cls.FLUSH_BATCH_SIZE
+                if full or deadline <= now:
+                    due.append(cls)
+                elif timeout is None or deadline - now < timeout:
+                    timeout = deadline - now
+        failed = False
+        for cls in due:
+            try:
+                cls.flush()
+            except Exception:
+                # Kept pending: retried after a pause, or by flush_all
+                failed = True
+                timeout = cls.FLUSH_INTERVAL
+        if due and not failed:
+            continue
+        _flush_event.wait(timeout)
+        _flush_event.clear()
+
+
+def _start_flusher():
+    """ Start the background flusher thread once
+    """
+    global _flusher
+    if _flusher is not None:
+        return
+    with DATA_LOCK:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop,
+                                        name="model-flusher", daemon=True)
+            _flusher.start()
+
+
+atexit.register(flush_all)
@@ -2,11 +2,9 @@
 """
 UserSession model to store session information in the database.
 """
-import os
-import json
 import uuid
-from datetime import datetime
-from models.base import Base
+from datetime import datetime, timedelta
+from models.base import Base, DATA_LOCK, TIMESTAMP_FORMAT
 
 
 class UserSession(Base):
@@ -17,6 +15,9 @@ class UserSession(Base):
         session_id (str): Unique session ID for the user's session.
     """
 
+    __slots__ = ("user_id", "session_id")
+    INDEXED_ATTRIBUTES = ("session_id", "user_id")
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize UserSession with user_id and session_id.
@@ -27,26 +28,43 @@ class UserSession(Base):
         super().__init__(*args, **kwargs)
         self.user_id = kwargs.get("user_id")
         self.session_id = kwargs.get("session_id", str(uuid.uuid4()))
-        # Set creation time to now if not provided
-        self.created_at = kwargs.get("created_at", datetime.now())
 
     def delete(self):
         """
-        Delete this session entry from the database (or file-based storage).
+        Delete this session entry from the database.
         """
-        # Implement deletion logic based on how data is stored
-        # Example: remove from a file-based storage
-        # by loading, filtering, and rewriting data
-        # Placeholder example if sessions are stored in a JSON file:
-        file_path = 'sessions.json'
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as file:
-                sessions = json.load(file)
+        self.remove()
 
-            # Filter out the current session by session_id
-            sessions = [
-                s for s in sessions if s.get('session_id') != self.session_id]
+    @classmethod
+    def purge_expired(cls, duration: int, now: datetime = None) -> int:
+        """
+        Remove the sessions created more than duration seconds ago,
+        persisting all the removals at once.
+        Args:
+            duration (int): Session lifetime in seconds; 0 or less keeps
+            every session.
+            now (datetime, optional): Current UTC time. Defaults to now.
+        Returns:
+            int: Number of sessions removed.
+        """
+        if duration <= 0:
+            return 0
+        cutoff = (now or datetime.utcnow()) - timedelta(seconds=duration)
+        expired = []
+        with DATA_LOCK:
+            # Raw records of a lazy load are checked without building them
+            for obj_id, created_at in cls._stored_values("created_at"):
+                if isinstance(created_at, str):
+                    created_at = datetime.strptime(created_at,
+                                                   TIMESTAMP_FORMAT)
+                if created_at is not None and created_at < cutoff:
+                    expired.append(obj_id)
 
-            # Write back the updated sessions list
-            with open(file_path, 'w') as file:
-                json.dump(sessions, file)
+        removed = 0
+        with cls.bulk():
+            for obj_id in expired:
+                user_session = cls.get(obj_id)
+                if user_session is not None:
+                    user_session.remove()
+                    removed += 1
+        return removed
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+""" Tests of the storage modes of models.base
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from models.user import User
+
+
+class TestStorageModes(unittest.TestCase):
+    """ Switching between the journal and snapshot storage modes
+    """
+
+    def setUp(self):
+        """ Run every test in an empty working directory
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        """ Restore the working directory
+        """
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_snapshot_write_drops_older_journal(self):
+        """ A snapshot written after journal mode is not reverted by the
+        leftover journal on the next load
+        """
+        with mock.patch.object(User, "STORAGE_MODE", "journal"):
+            User.load_from_file()
+            user = User(id="u1", first_name="One")
+            user.save()
+        self.assertTrue(os.path.exists(".db_User.journal"))
+
+        with mock.patch.object(User, "STORAGE_MODE", "snapshot"):
+            User.load_from_file()
+            user = User.get("u1")
+            user.first_name = "Two"
+            user.save()
+            self.assertFalse(os.path.exists(".db_User.journal"))
+
+            User.load_from_file()
+            self.assertEqual(User.get("u1").first_name, "Two")
+
+
+if __name__ == "__main__":
+    unittest.main()
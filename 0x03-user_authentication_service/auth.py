@@ -5,12 +5,96 @@ This module contains helper functions for password hashing
 """
 
 import bcrypt
+import os
+import time
 from db import DB
 from sqlalchemy.orm.exc import NoResultFound
 from typing import Union
 from user import User
 from uuid import uuid4
 
+BCRYPT_TARGET_MS = 250
+BCRYPT_MIN_ROUNDS = 4
+BCRYPT_DEFAULT_ROUNDS = 12
+BCRYPT_MAX_ROUNDS = 31
+ROUNDS_FILE = ".bcrypt_rounds"
+_rounds = None
+
+
+def calibrate_rounds(target_ms: float = BCRYPT_TARGET_MS) -> int:
+    """
+    Finds the bcrypt cost whose hashing time on this host is closest to,
+    without exceeding, the target.
+    Args:
+        target_ms (float): The time budget for one hash in milliseconds.
+    Returns:
+        int: The number of bcrypt rounds to use.
+    """
+    # Time a cheap cost, then extrapolate: each round doubles the work
+    rounds = 8
+    salt = bcrypt.gensalt(rounds)
+    elapsed = None
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        sample = (time.perf_counter() - start) * 1000
+        elapsed = sample if elapsed is None else min(elapsed, sample)
+
+    while rounds > BCRYPT_MIN_ROUNDS and elapsed > target_ms:
+        rounds -= 1
+        elapsed /= 2
+    while rounds < BCRYPT_MAX_ROUNDS and elapsed * 2 <= target_ms:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+
+def get_rounds() -> int:
+    """
+    Returns the bcrypt cost for new hashes: BCRYPT_ROUNDS if set (clamped
+    to BCRYPT_MIN_ROUNDS..BCRYPT_MAX_ROUNDS, the range gensalt accepts),
+    else the cost stored in ROUNDS_FILE, else a fresh calibration
+    against BCRYPT_TARGET_MS, which is then stored in ROUNDS_FILE when
+    it is writable. Stored and calibrated costs never go below
+    BCRYPT_DEFAULT_ROUNDS, so a calibration on a loaded host can't
+    weaken new hashes.
+    """
+    global _rounds
+    if _rounds is not None:
+        return _rounds
+    try:
+        rounds = int(os.getenv("BCRYPT_ROUNDS", ""))
+        _rounds = min(max(rounds, BCRYPT_MIN_ROUNDS), BCRYPT_MAX_ROUNDS)
+        return _rounds
+    except ValueError:
+        pass
+    try:
+        with open(ROUNDS_FILE) as f:
+            rounds = int(f.read())
+    except (OSError, ValueError):
+        rounds = calibrate_rounds()
+        try:
+            with open(ROUNDS_FILE, "w") as f:
+                f.write(str(rounds))
+        except OSError:
+            pass  # keep the calibrated cost for this process only
+    _rounds = min(max(rounds, BCRYPT_DEFAULT_ROUNDS), BCRYPT_MAX_ROUNDS)
+    return _rounds
+
+
+def needs_rehash(hashed_password: Union[bytes, str]) -> bool:
+    """
+    Checks whether a hash was made with a lower cost than get_rounds();
+    hashes are only ever upgraded.
+    Args:
+        hashed_password (ByteString): The hashed password.
+    Returns:
+        bool: True if the password should be hashed again.
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode()
+    return int(hashed_password.split(b"$")[2]) < get_rounds()
+
 
 def _hash_password(password: str) -> str:
     """
@@ -20,8 +104,9 @@ def _hash_password(password: str) -> str:
     Returns:
         bytes: A salted hash of the input password.
     """
-    # Hash the password with the generated salt
-    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    # Hash the password with a salt at the calibrated cost
+    salt = bcrypt.gensalt(get_rounds())
+    hashed = bcrypt.hashpw(password.encode(), salt)
     return hashed
 
 
@@ -84,7 +169,14 @@ class Auth:
         except NoResultFound:
             return False
         # check validity of password
-        return bcrypt.checkpw(password.encode('utf-8'), user.hashed_password)
+        if not bcrypt.checkpw(password.encode('utf-8'),
+                              user.hashed_password):
+            return False
+        # rehash with the current cost if the stored hash is weaker
+        if needs_rehash(user.hashed_password):
+            self._db.update_user(user.id,
+                                 hashed_password=_hash_password(password))
+        return True
 
     def create_session(self, email: str) -> str:
         """